@@ -1,119 +1,545 @@
 
 
+import asyncio
+import gzip
 import json
 import logging
-from datetime import datetime
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
 
 import boto3
+from tornado import httpclient
 
-from controller import SmartAPI
-from utils import indices
+from controller import ControllerError, SmartAPI, digest, documents
+from model import APIDoc
+from utils import decoder, indices
+from utils.concurrency import HostLimiter
+from utils.downloader import download_async
+from utils.s3 import MultipartUpload
 
 logging.basicConfig(level="INFO")
 
+# a local S3 stand-in, like http://localhost:9000
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
 
-def _default_filename():
-    return "smartapi_" + datetime.today().strftime("%Y%m%d") + ".json"
 
+# backup chains, full and incremental backups,
+# rebuilt by replaying the increments since a full
+FULL_BACKUP_INTERVAL = 7  # backups per chain, nightly
 
-def save_to_file(mapping, filename=None):
-    filename = filename or _default_filename()
-    with open(filename, 'w') as file:
-        json.dump(mapping, file, indent=2)
+DATA_SUFFIX = '.ndjson.gz'
+MANIFEST_SUFFIX = '.manifest.json'
 
 
-def save_to_s3(mapping, filename=None, bucket="smartapi"):
-    filename = filename or _default_filename()
-    s3 = boto3.resource('s3')
-    s3.Bucket(bucket).put_object(
-        Key='db_backup/{}'.format(filename),
-        Body=json.dumps(mapping, indent=2)
-    )
-
-
-def _backup():
-    smartapis = []
-    for smartapi in SmartAPI.get_all(1000):
-        smartapis.append({
-            "url": smartapi.url,
-            "username": smartapi.username,
-            "slug": smartapi.slug,
-            "date_created": smartapi.date_created.isoformat(),
-            "last_updated": smartapi.last_updated.isoformat(),
-            "raw": smartapi.raw.decode()  # to string
-        })
-    return smartapis
+def _default_filename():
+    return "smartapi_" + datetime.today().strftime("%Y%m%d") + DATA_SUFFIX
+
+
+def _manifest_key(key):
+    if key.endswith(DATA_SUFFIX):
+        key = key[:-len(DATA_SUFFIX)]
+    return key + MANIFEST_SUFFIX
+
+
+def _backup(ids=None):
+    """
+    Generate a backup record for each document, or
+    the ones with the ids, read from the database
+    without parsing it.
+    """
+    search = APIDoc.search().source(['_meta', '_raw'])
+    if ids is not None:
+        search = search.filter('ids', values=list(ids))
+    for doc in APIDoc.iterate(search):
+        yield {
+            "url": doc._meta.url,
+            "username": doc._meta.username,
+            "slug": doc._meta.slug,
+            "date_created": doc._meta.date_created.isoformat(),
+            "last_updated": doc._meta.last_updated.isoformat(),
+            "raw": decoder.decompress(doc._raw).decode()  # to string
+        }
+
+
+def _dump(smartapis, file):
+    """
+    Write the records to a binary file as gzip
+    compressed NDJSON, one document at a time.
+    """
+    count = 0
+    with gzip.GzipFile(fileobj=file, mode='wb') as _file:
+        for smartapi in smartapis:
+            _file.write(json.dumps(smartapi).encode() + b'\n')
+            count += 1
+    return count
+
+
+def _load(file, compressed=True):
+    """
+    Read the records from a binary file, gzip compressed
+    NDJSON, one document at a time, or a JSON array.
+    """
+    if not compressed:
+        yield from json.load(file)  # previous format
+        return
+    with gzip.GzipFile(fileobj=file, mode='rb') as _file:
+        for line in _file:
+            if line.strip():
+                yield json.loads(line)
 
 
 def backup_to_file(filename=None):
-    smartapis = _backup()
-    save_to_file(smartapis, filename)
-
-
-def backup_to_s3(filename=None, bucket="smartapi"):
-    smartapis = _backup()
-    save_to_s3(smartapis, filename, bucket)
-
+    filename = filename or _default_filename()
+    with open(filename, 'wb') as file:
+        count = _dump(_backup(), file)
+    logging.info("Saved %s documents to %s.", count, filename)
+
+
+def _versions():
+    """
+    Return the digest of the _meta field of each
+    document, which changes with last_updated,
+    and the slug and the owner, by _id.
+    """
+    search = APIDoc.search().source(['_meta'])
+    return {
+        doc.meta.id: digest(json.dumps(
+            doc._meta.to_dict(), sort_keys=True, default=str
+        ).encode()) for doc in APIDoc.iterate(search, 1000)
+    }
+
+
+def _list_backups(s3, bucket):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix='db_backup/'):
+        yield from page.get('Contents', ())
+
+
+def _read_manifest(s3, bucket, key):
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(obj['Body'].read())
+
+
+def _latest_manifest(s3, bucket):
+    """
+    Return the key and the content of the
+    latest manifest, or (None, None).
+    """
+    objects = [
+        obj for obj in _list_backups(s3, bucket)
+        if obj['Key'].endswith(MANIFEST_SUFFIX)
+    ]
+    if not objects:
+        return None, None
+    latest = max(obj['LastModified'] for obj in objects)
+    manifests = [  # LastModified is in seconds
+        (obj['Key'], _read_manifest(s3, bucket, obj['Key']))
+        for obj in objects if obj['LastModified'] == latest
+    ]
+    return max(manifests, key=lambda manifest: manifest[1]['created'])
+
+
+def backup_to_s3(filename=None, bucket="smartapi", incremental=None):
+    """
+    Backup all documents, a full backup, or the ones changed
+    since the latest backup, an incremental one, by default
+    if the latest full backup is recent. Save a manifest
+    of the documents with each backup, chaining them.
+    """
+    s3 = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+    parent_key, parent = _latest_manifest(s3, bucket)
+    if incremental is None:
+        incremental = bool(parent) and parent['chain'] < FULL_BACKUP_INTERVAL - 1
+    elif incremental and not parent:
+        logging.warning("No previous backup, saving a full backup.")
+        incremental = False
+
+    versions = _versions()
+    manifest = {
+        "type": "full",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "parent": None,
+        "base": None,
+        "chain": 0,
+        "documents": versions,
+        "deleted": []
+    }
+    ids = None  # all
+    if incremental:
+        ids = [
+            _id for _id, version in versions.items()
+            if parent['documents'].get(_id) != version
+        ]
+        manifest.update({
+            "type": "incremental",
+            "parent": parent_key,
+            "base": parent['base'] or parent_key,
+            "chain": parent['chain'] + 1,
+            "deleted": [_id for _id in parent['documents'] if _id not in versions]
+        })
+        if not ids and not manifest['deleted']:
+            logging.info("No changes since %s.", parent_key)
+            return
+        base = manifest['base'][:-len(MANIFEST_SUFFIX)]
+        filename = filename or f"{base.split('/')[-1]}.{manifest['chain']}{DATA_SUFFIX}"
 
-def _restore(smartapis):
-    if indices.exists():
-        logging.error("Cannot write to an existing index.")
-        return
-    indices.reset()
-    for smartapi in smartapis:
-        logging.info(smartapi["url"])
+    filename = filename or _default_filename()
+    manifest['data'] = 'db_backup/' + filename
+    manifest_key = _manifest_key(manifest['data'])
+
+    with MultipartUpload(
+        s3, bucket, manifest['data'],
+        ContentType='application/x-ndjson',
+        ContentEncoding='gzip'
+    ) as file:
+        count = _dump(_backup(ids), file)
+    s3.put_object(
+        Bucket=bucket, Key=manifest_key,
+        Body=json.dumps(manifest).encode(),
+        ContentType='application/json')
+
+    logging.info(
+        "Saved %s backup of %s documents, %s deleted, to s3://%s/%s.",
+        manifest['type'], count, len(manifest['deleted']), bucket, manifest['data'])
+
+
+def _prepare(smartapi):
+    """
+    Build the index action of a backup record.
+    Return (action, warning) or (None, error).
+    Run in worker processes.
+    """
+    try:
         _smartapi = SmartAPI(smartapi["url"])
+        _smartapi.raw = smartapi["raw"].encode()  # to bytes
         _smartapi.username = smartapi["username"]
         _smartapi.slug = smartapi["slug"]
         _smartapi.date_created = datetime.fromisoformat(smartapi["date_created"])
         _smartapi.last_updated = datetime.fromisoformat(smartapi["last_updated"])
-        _smartapi.raw = smartapi["raw"].encode()  # to bytes
-        _smartapi.save()
-
-
-def restore_from_s3(filename=None, bucket="smartapi"):
-
-    s3 = boto3.client('s3')
+    except (ControllerError, AssertionError, AttributeError,
+            KeyError, TypeError, ValueError) as err:  # malformed record
+        return None, f"{smartapi.get('url')}: {str(err) or type(err).__name__}"
+
+    warning = None
+    try:  # restore anyway
+        _smartapi.validate()
+    except ControllerError as err:
+        warning = f"{_smartapi.url}: {err}"
+
+    try:
+        doc = _smartapi._to_doc()
+        doc.full_clean()
+    except (ControllerError, ValueError) as err:
+        return None, f"{_smartapi.url}: {err}"
+
+    return doc.to_dict(include_meta=True), warning
+
+
+def _restore(smartapis, workers=None, batch_size=500):
+    """
+    Index the backup records in a new index, decoded and
+    validated in worker processes, os.cpu_count() by default,
+    zero to run in this process, indexed in bulk, batch_size
+    documents at a time. Report failures without stopping.
+    """
+    if indices.exists():
+        logging.error("Cannot write to an existing index.")
+        return
+    indices.reset()
+    indices.refresh_interval("-1")
+
+    _t0 = time.perf_counter()
+    report = Counter()
+    pool = ProcessPoolExecutor(workers) if workers != 0 else None
+    try:
+        records = iter(smartapis)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            actions = []
+            results = pool.map(_prepare, batch) if pool else map(_prepare, batch)
+            for action, message in results:
+                if action is None:
+                    logging.error(message)
+                    report['failed'] += 1
+                    continue
+                if message:
+                    logging.warning(message)
+                    report['invalid'] += 1
+                actions.append(action)
+            saved, errors = APIDoc.bulk(actions)
+            for error in errors:
+                logging.error(error)
+            report['saved'] += saved
+            report['failed'] += len(errors)
+    finally:
+        if pool:
+            pool.shutdown()
+        indices.refresh_interval(None)
+        indices.refresh()
+
+    seconds = time.perf_counter() - _t0
+    logging.info(
+        "Restored %s documents in %.1fs, %.1f/s, %s invalid, %s failed.",
+        report['saved'], seconds, report['saved'] / max(seconds, 1e-3),
+        report['invalid'], report['failed'])
+    return report
+
+
+def _load_s3(s3, bucket, key):
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    compressed = obj.get('ContentEncoding') == 'gzip' or key.endswith('.gz')
+    yield from _load(obj['Body'], compressed)
+
+
+def _replay(s3, bucket, key):
+    """
+    Generate the records of the documents in a manifest,
+    from its backup, and the ones before it in the chain,
+    the latest version of each, skipping deleted ones.
+    """
+    manifest = _read_manifest(s3, bucket, key)
+    remaining = set(manifest['documents'])
+    while manifest and remaining:
+        logging.info("GET s3://%s/%s", bucket, manifest['data'])
+        for smartapi in _load_s3(s3, bucket, manifest['data']):
+            _id = SmartAPI(smartapi['url'])._id
+            if _id in remaining:
+                remaining.remove(_id)
+                yield smartapi
+        if manifest['parent']:
+            manifest = _read_manifest(s3, bucket, manifest['parent'])
+        else:  # full backup
+            manifest = None
+    if remaining:
+        logging.error("%s documents not found in the backups.", len(remaining))
+
+
+def restore_from_s3(filename=None, bucket="smartapi", workers=None):
+    """
+    Restore a backup, by default the latest state, replaying
+    the chain of backups of the latest manifest. A manifest
+    filename restores its chain, others a single backup.
+    """
+    s3 = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
 
     if not filename:
-        objects = s3.list_objects_v2(Bucket='smartapi', Prefix='db_backup')['Contents']
+        filename, _ = _latest_manifest(s3, bucket)
+
+    if not filename:  # previous backups without manifests
+        objects = list(_list_backups(s3, bucket))
         filename = max(objects, key=lambda x: x['LastModified'])['Key']
 
     if not filename.startswith('db_backup/'):
         filename = 'db_backup/' + filename
 
-    logging.info("GET s3://%s/%s", bucket, filename)
+    if filename.endswith(MANIFEST_SUFFIX):
+        logging.info("Replay s3://%s/%s", bucket, filename)
+        _restore(_replay(s3, bucket, filename), workers)
+    else:
+        logging.info("GET s3://%s/%s", bucket, filename)
+        _restore(_load_s3(s3, bucket, filename), workers)
+
+
+def restore_from_file(filename, workers=None):
+    with open(filename, 'rb') as file:
+        compressed = file.peek(2)[:2] == decoder.GZIP_MAGIC
+        _restore(_load(file, compressed), workers)
+
+
+def _setup_client(concurrency):
+    # the http client of the current event loop,
+    # with a connection for each concurrent request.
+    httpclient.AsyncHTTPClient(max_clients=concurrency)
+
+
+def _save_refreshed(smartapis):
+    # only updated documents have new content,
+    # for the others, the status is all that changed.
+    updated = [smartapi for smartapi in smartapis if smartapi.webdoc.status == 299]
+    others = [smartapi for smartapi in smartapis if smartapi.webdoc.status != 299]
+    saved, errors = SmartAPI.bulk_save(updated) if updated else (0, [])
+    _saved, _errors = SmartAPI.bulk_save_status(others) if others else (0, [])
+    return saved + _saved, errors + _errors
+
+
+async def _process(smartapis, process, save, report, timeout, batch_size, limit):
+    """
+    Run the coroutine function process(smartapi), returning a status,
+    for the documents, read from the smartapis iterable as it goes,
+    at most limit at a time. Stop after timeout seconds, leaving the
+    rest unchanged. Save the results with save(smartapis) every
+    batch_size documents. Count the documents of each status in report.
+    """
+    logger = logging.getLogger("admin")
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+
+    async def flush(batch):
+        saved, errors = await loop.run_in_executor(None, save, batch)
+        for error in errors:
+            logger.error(error)
+        return saved
+
+    smartapis = iter(smartapis)
+    tasks = set()
+    batch = []
+    while True:
+        while len(tasks) < limit:
+            # reads a page from the database every page_size
+            smartapi = await loop.run_in_executor(None, next, smartapis, None)
+            if smartapi is None:
+                break
+            report['total'] += 1
+            tasks.add(asyncio.ensure_future(process(smartapi)))
+        if not tasks:
+            break
+        done, tasks = await asyncio.wait(
+            tasks, timeout=max(deadline - loop.time(), 0),
+            return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            for task in tasks:
+                task.cancel()
+            report['timeout'] = len(tasks)
+            logger.warning(
+                "Deadline reached, %s cancelled, the rest not started.",
+                report['timeout'])
+            break
+        for task in done:
+            try:
+                smartapi, status = task.result()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to process.")
+                report['error'] += 1
+                continue
+            logger.info("%s %s", smartapi._id, status)
+            report[status] += 1
+            batch.append(smartapi)
+        if len(batch) >= batch_size:
+            report['saved'] += await flush(batch)
+            batch = []
+    if batch:
+        report['saved'] += await flush(batch)
+
+    return report
+
+
+async def _refresh(smartapis, concurrency, per_host, timeout, batch_size, save):
+
+    _setup_client(concurrency)
+    limiter = HostLimiter(concurrency, per_host)
+    report = Counter()
+
+    async def refresh(smartapi):
+        async with limiter(smartapi.url):
+            file = await download_async(
+                smartapi.url, raise_error=False,
+                **smartapi.webdoc.conditions)
+        if file.status == 304:
+            report['bytes_saved'] += len(smartapi.raw)
+        return smartapi, smartapi.refresh(file)
+
+    return await _process(
+        smartapis, refresh, save, report,
+        timeout, batch_size, concurrency * 4)
+
+
+def refresh_document(concurrency=16, per_host=4, timeout=1800, batch_size=100, save=_save_refreshed):
+    """
+    Refresh all documents concurrently, at most concurrency
+    downloads at a time, and per_host for each host. Stop
+    after timeout seconds, leaving the rest unchanged.
+    Save the results every batch_size documents with
+    save(smartapis), returning (saved, errors).
+    """
+    logger = logging.getLogger("refresh")
+    _t0 = time.perf_counter()
 
-    obj = s3.get_object(
-        Bucket=bucket,
-        Key=filename
-    )
-    smartapis = json.loads(obj['Body'].read())
-    _restore(smartapis)
+    smartapis = SmartAPI.iterate()
+    report = asyncio.run(_refresh(smartapis, concurrency, per_host, timeout, batch_size, save))
 
+    logger.info(
+        "Refreshed %s documents in %.1fs: %s",
+        report['total'], time.perf_counter() - _t0, dict(report))
+    logger.info("Conditional requests saved %s bytes.", report['bytes_saved'])
 
-def restore_from_file(filename):
-    with open(filename) as file:
-        smartapis = json.load(file)
-        _restore(smartapis)
 
+async def _check(smartapis, concurrency, per_host, budget, timeout, batch_size):
 
-def refresh_document():
-    logger = logging.getLogger("refresh")
-    for smartapi in SmartAPI.get_all(1000):
-        logger.info(smartapi._id)
-        _status = smartapi.refresh()
-        logger.info(_status)
-        smartapi.save()
+    _setup_client(concurrency)
+    limiter = HostLimiter(concurrency, per_host)
+
+    async def check(smartapi):
+        return smartapi, await smartapi.check_async(limiter, budget)
+
+    return await _process(
+        smartapis, check, SmartAPI.bulk_save_status, Counter(),
+        timeout, batch_size, concurrency * 4)
 
 
-def check_uptime():
+def check_uptime(concurrency=32, per_host=4, budget=60, timeout=1800, batch_size=100):
+    """
+    Check all documents concurrently, at most concurrency
+    api calls at a time, and per_host for each host. Spend
+    at most budget seconds on each document, once its first
+    call gets a slot, and timeout seconds in total. Save the
+    results every batch_size.
+    """
     logger = logging.getLogger("uptime")
-    for smartapi in SmartAPI.get_all(1000):
-        logger.info(smartapi._id)
-        _status = smartapi.check()
-        logger.info(_status)
-        smartapi.save()
+    _t0 = time.perf_counter()
+
+    smartapis = SmartAPI.iterate()
+    report = asyncio.run(_check(smartapis, concurrency, per_host, budget, timeout, batch_size))
+
+    logger.info(
+        "Checked %s documents in %.1fs: %s",
+        report['total'], time.perf_counter() - _t0, dict(report))
+
+
+def train_dictionary(size=112640):
+    """
+    Train a zstd dictionary on all documents.
+    To compress with it, set ZSTD_DICT_ID to the
+    returned id, and COMPRESSION to zstd.
+    """
+    logger = logging.getLogger("compression")
+    samples = [smartapi.raw for smartapi in SmartAPI.iterate()]
+    dict_id = decoder.train_dictionary(samples, size)
+    logger.info("Trained dictionary %s on %s documents.", dict_id, len(samples))
+    return dict_id
+
+
+def recompress(batch_size=100):
+    """
+    Save all documents again, compressed with the
+    configured COMPRESSION and ZSTD_DICT_ID.
+    """
+    logger = logging.getLogger("compression")
+
+    def flush(batch):
+        saved, errors = SmartAPI.bulk_save(batch)
+        for error in errors:
+            logger.error(error)
+        return saved
+
+    saved, gzipped, compressed, batch = 0, 0, 0, []
+    for smartapi in SmartAPI.iterate():
+        gzipped += len(decoder.compress(smartapi.raw, 'gzip'))
+        compressed += len(decoder.compress(smartapi.raw))
+        batch.append(smartapi)
+        if len(batch) >= batch_size:
+            saved += flush(batch)
+            batch = []
+    if batch:
+        saved += flush(batch)
+    logger.info(
+        "Recompressed %s documents to %s bytes, %s bytes with gzip.",
+        saved, compressed, gzipped)
 
 
 restore = restore_from_file
@@ -131,6 +557,7 @@ def routine():
     refresh_document()
     logger.info("check_uptime()")
     check_uptime()
+    logger.info("Document cache: %s", documents.stats())
 
 
 if __name__ == '__main__':
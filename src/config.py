@@ -25,6 +25,15 @@ ES_INDICES = {
     'metadata': 'smartapi_docs'
 }
 
+# *****************************************************************************
+# Validation
+# *****************************************************************************
+# Decode and validate submitted documents in worker processes.
+# Zero to run them in the web server process like other handlers.
+VALIDATION_WORKERS = 0
+# Documents allowed to wait for a worker, respond 429 beyond that.
+VALIDATION_QUEUE = 32
+
 # *****************************************************************************
 # Tornado URL Patterns
 # *****************************************************************************
@@ -34,53 +34,58 @@
         smartapi.delete()
 
 """
+import gzip
+import json
 import logging
+import os
 import string
 import sys
+import time
 from abc import ABC, abstractmethod
 from collections import OrderedDict, UserDict, UserString
 from collections.abc import Mapping
 from configparser import ConfigParser
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from enum import IntEnum
+from threading import Lock
 from urllib.parse import urlparse
 from warnings import warn
 
 import jsonschema
+import yaml
 from elasticsearch.exceptions import NotFoundError as ESNotFoundError
+from jsonschema.exceptions import best_match
 
 from model import APIDoc
 from utils import decoder, monitor
-from utils.downloader import Downloader, File, download
+from utils.downloader import File, download
+from utils.schemas import SchemaStore, SchemaStoreError
 
 if sys.version_info.major >= 3 and sys.version_info.minor >= 6:
     from hashlib import blake2b
 else:
     from pyblake2 import blake2b  # pylint: disable=import-error
 
+try:  # optional code-generated validation engine
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 logger = logging.getLogger(__name__)
 
 config = ConfigParser()
 config.read('schemas.ini')
 
-# TODO etag support
-
 # NOTE
-# Consider allowing the application to launch
-# when the core schema download fails. If that
-# happens, disable any modifications and alert
-# some slack channel to report the event.
-
-openapis = Downloader()
-openapis.download(
-    config['openapi'].keys(),
-    config['openapi'].values()
-)
-swaggers = Downloader()
-swaggers.download(
-    config['swagger'].keys(),
-    config['swagger'].values()
-)
+# Schemas are loaded on first validation, from the
+# local cache if available, so that the application
+# can launch without network access. If a schema is
+# neither cached nor downloadable, validation fails.
+
+pins = config['pins'] if config.has_section('pins') else {}
+
+openapis = SchemaStore(config['openapi'], pins)
+swaggers = SchemaStore(config['swagger'], pins)
 
 
 class ControllerError(Exception):
@@ -95,10 +100,128 @@ class ConflictError(ControllerError):
     pass
 
 
+class Validators(UserDict):
+    """
+        Registry of compiled schema validators.
+        Each validator is built and checked once,
+        then reused across validation calls.
+
+        Engines:
+            jsonschema: interpreted validators only.
+            fastjsonschema: generated python functions
+                accept valid documents, jsonschema is
+                used to report on the invalid ones.
+    """
+
+    ENGINES = ('jsonschema', 'fastjsonschema')
+
+    def __init__(self, engine='jsonschema'):
+        super().__init__()
+        self.engine = engine
+        self.functions = {}
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, value):
+        if value not in self.ENGINES:
+            raise ValueError(f"Unknown validation engine '{value}'.")
+        if value == 'fastjsonschema' and not fastjsonschema:
+            logger.warning("fastjsonschema not installed, use jsonschema.")
+            value = 'jsonschema'
+        self._engine = value
+
+    def load(self, name, schema):
+        """
+        Return a validator of the schema registered under the name.
+        Rebuild it if a different schema is provided under the name.
+        """
+        validator = self.data.get(name)
+        if validator is None or validator.schema is not schema:
+            cls = jsonschema.validators.validator_for(schema)
+            cls.check_schema(schema)  # raise SchemaError
+            validator = cls(schema)
+            self.data[name] = validator
+        return validator
+
+    def compile(self, name, schema):
+        """
+        Return a generated validation function of the schema
+        registered under the name, or None if not supported.
+        """
+        if name in self.functions:
+            _schema, function = self.functions[name]
+            if _schema is schema:
+                return function
+        try:  # do not fill in defaults, keep the document as is
+            function = fastjsonschema.compile(schema, use_default=False)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Cannot compile %s schema: %s", name, exc)
+            function = None
+        self.functions[name] = (schema, function)
+        return function
+
+    def accepts(self, name, schema, doc):
+        """
+        Fast path validation. True if the document is
+        known to be valid, False if it needs to be
+        checked by the jsonschema validator.
+        """
+        if self.engine != 'fastjsonschema':
+            return False
+        function = self.compile(name, schema)
+        if function is None:
+            return False
+        try:
+            function(doc)
+        except fastjsonschema.JsonSchemaException:
+            return False
+        return True
+
+
+validators = Validators(os.getenv('VALIDATION_ENGINE', 'jsonschema'))
+
+
+def _isoformat(value):
+    # dates in yaml documents
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def digest(stream):
+    """
+        Hash of a byte stream.
+        Detect content changes.
+    """
+    return blake2b(stream, digest_size=16).hexdigest()
+
+
+_fingerprint = ((), None)
+
+
+def fingerprint():
+    """
+        Hash of all schemas in use.
+        Change when any schema changes.
+    """
+    global _fingerprint  # pylint: disable=global-statement
+
+    schemas = tuple(openapis.items()) + tuple(swaggers.items())
+    if _fingerprint[0] != schemas:  # compare by identity first
+        _bytes = json.dumps(schemas, sort_keys=True).encode()
+        _fingerprint = (schemas, digest(_bytes))
+
+    return _fingerprint[1]
+
+
 def validate(doc, schemas):
     """
         Validate a document agasint schemas.
         Schemas is a dict of name and schema pairs.
+        Raise SchemaStoreError if schemas are unavailable.
     """
 
     # required by jsonschema package
@@ -107,7 +230,13 @@ def validate(doc, schemas):
 
     try:  # validate agasint every schema
         for name, schema in schemas.items():
-            jsonschema.validate(doc, schema)
+            validator = validators.load(name, schema)
+            if validators.accepts(name, schema, doc):
+                continue  # no error to report
+            # same error selection as jsonschema.validate
+            error = best_match(validator.iter_errors(doc))
+            if error is not None:
+                raise error
 
     except jsonschema.ValidationError as err:
         _ = (
@@ -118,6 +247,9 @@ def validate(doc, schemas):
         )
         raise ValueError(_) from err
 
+    except SchemaStoreError:
+        raise  # not the document's fault
+
     except Exception as err:
         _ = (
             f"Unexpected Validation Error: "
@@ -275,6 +407,15 @@ class APIRefreshStatus(AbstractEntityStatus):
     """
         API Document Refresh Status.
         Support HTTP status codes and the ones below.
+
+        Remember the validation result of the last
+        validated content, keyed by its digest and
+        the schema fingerprint, to skip revalidating
+        content that has not changed since.
+
+        Remember the ETag and Last-Modified headers of
+        the last successful fetch, to download again only
+        if the file changed. A 304 is NOT_MODIFIED.
     """
 
     class STATUS(IntEnum):
@@ -283,27 +424,81 @@ class APIRefreshStatus(AbstractEntityStatus):
         UPDATED = 299  # new version available and update successful
         INVALID = 499  # cannot update to new version because validation failed
 
+    def __init__(self, entity, status=None, timestamp=None, validation=None, conditions=None):
+        super().__init__(entity, status, timestamp)
+        self._validation = validation or (None, None)
+        self._conditions = conditions or (None, None)
+
+    @property
+    def validation(self):
+        """
+        The (key, passed) pair of the last validated content.
+        Invalidated when either the content or a schema changes.
+        """
+        return self._validation
+
+    @property
+    def conditions(self):
+        """
+        Conditional request arguments for the downloader,
+        the (etag, last_modified) of the last successful fetch.
+        """
+        return dict(zip(('etag', 'last_modified'), self._conditions))
+
+    @staticmethod
+    def key(raw):
+        return digest(raw) + '.' + fingerprint()
+
+    def cache(self, raw, passed):
+        self._validation = (self.key(raw), passed)
+
     def update(self, content):
 
         if not isinstance(content, File):
             raise TypeError("Invalid content.")
 
+        previous = (self._status, self._timestamp)
         super().update(content)
         self._status = content.status
 
         if content.date:  # more accurate
             self._timestamp = content.date
 
+        if content.status == 304:  # conditional request
+            self._status = self.STATUS.NOT_MODIFIED.value
+            return
+
         if content.status != 200 or not content.raw:
             return  # no need to update _raw
 
+        try:
+            key = self.key(content.raw)
+        except SchemaStoreError:  # when validating below
+            key = None
+
+        if key and key == self._validation[0]:  # validated before
+            if not self._validation[1]:
+                self._status = self.STATUS.INVALID.value
+                return
+            if self._entity.raw == content.raw:
+                self._status = self.STATUS.NOT_MODIFIED.value
+                self._conditions = (content.etag, content.last_modified)
+                return
+
         try:
             smartapi = SmartAPI(SmartAPI.VALIDATION_ONLY)
             smartapi.raw = content.raw
             smartapi.validate()
+        except SchemaStoreError as err:
+            # cannot tell, not a validation result
+            logger.error("Cannot validate %s: %s", self._entity.url, err)
+            self._status, self._timestamp = previous
         except ControllerError:
             self._status = self.STATUS.INVALID.value
+            self._validation = (key, False)
         else:  # safe to update
+            self._validation = (key, True)
+            self._conditions = (content.etag, content.last_modified)
             if self._entity.raw in (content.raw, None):
                 self._status = self.STATUS.NOT_MODIFIED.value
             else:  # raw field changed
@@ -311,6 +506,196 @@ class APIRefreshStatus(AbstractEntityStatus):
             self._entity.raw = content.raw
 
 
+class SlugRegistry():
+    """
+        In-process map of slugs to document _ids.
+        Loaded from the database, kept current by save
+        and delete, to be reloaded periodically to pick
+        up changes made by other processes.
+        Lookups of unregistered slugs are remembered
+        for ttl seconds before checking the database.
+    """
+
+    RESERVED = frozenset(('www', 'dev', 'smart-api', 'api'))
+
+    def __init__(self, ttl=300, max_misses=10000):
+
+        self.ttl = ttl
+        self.max_misses = max_misses
+
+        self._ids = {}  # slug: _id
+        self._slugs = {}  # _id: slug
+        self._misses = {}  # slug: time
+
+    def load(self):
+        """
+        Replace the map with the slugs in the database.
+        """
+        search = APIDoc.search()
+        search = search.filter('exists', field='_meta.slug')
+        search = search.source(['_meta.slug'])
+
+        ids = {}
+        for hit in APIDoc.iterate(search, 1000):
+            ids[hit._meta.slug] = hit.meta.id
+
+        self._ids = ids
+        self._slugs = {_id: slug for slug, _id in ids.items()}
+        self._misses = {}
+
+    def get(self, slug):
+        """
+        Return the _id registered with the slug or None.
+        """
+        try:
+            SmartAPI.slug.validate(slug)
+        except ValueError:
+            return None  # never registered
+
+        if slug in self._ids:
+            return self._ids[slug]
+
+        missed = self._misses.get(slug)
+        if missed and time.monotonic() - missed < self.ttl:
+            return None
+
+        _id = APIDoc.exists(slug, '_meta.slug')
+        if _id:
+            self.update(_id, slug)
+        else:  # remember the miss
+            if len(self._misses) >= self.max_misses:
+                self._misses.clear()
+            self._misses[slug] = time.monotonic()
+        return _id
+
+    def update(self, _id, slug):
+        """
+        Register the slug of a document, replacing its previous one.
+        """
+        self.remove(_id)
+        if slug:
+            self._ids[slug] = _id
+            self._slugs[_id] = slug
+            self._misses.pop(slug, None)
+
+    def remove(self, _id):
+        slug = self._slugs.pop(_id, None)
+        if self._ids.get(slug) == _id:
+            del self._ids[slug]
+
+
+slugs = SlugRegistry()
+
+
+class DocumentCache():
+    """
+        LRU cache of decoded documents, keyed by their
+        _ids and last updated times, one version each.
+        Bounded by the size of the raw content, of the
+        decoded data, estimated at DECODED_FACTOR times
+        the raw size, and of the serialized views, a proxy
+        for the memory used. Entries are shared, treat
+        them as read-only.
+    """
+
+    # the decoded test documents take 3.5 to 6
+    # times their raw size in python objects.
+    DECODED_FACTOR = 6
+
+    def __init__(self, size=64 * 1024 * 1024):
+
+        self.size = size  # in bytes
+        self.used = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # _id: (last_updated, raw, data, fmt, views)
+        # views: name: serialized bytes
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, _id, last_updated):
+        """
+        Return the (raw, data, fmt) of a document version or None.
+        """
+        with self._lock:
+            entry = self._entries.get(_id)
+            if entry and entry[0] == last_updated:
+                self._entries.move_to_end(_id)
+                self.hits += 1
+                return entry[1:4]
+            self.misses += 1
+            return None
+
+    def put(self, _id, last_updated, raw, data, fmt):
+
+        if self._estimate(raw) > self.size:
+            return  # would evict everything
+
+        with self._lock:
+            self._remove(_id)
+            self._entries[_id] = (last_updated, raw, data, fmt, {})
+            self.used += self._estimate(raw)
+            self._evict()
+
+    def get_view(self, _id, last_updated, name):
+        """
+        Return a serialized view of a document version or None.
+        """
+        with self._lock:
+            entry = self._entries.get(_id)
+            if entry and entry[0] == last_updated:
+                return entry[4].get(name)
+            return None
+
+    def put_view(self, _id, last_updated, name, content):
+        """
+        Add a serialized view to a cached document version.
+        """
+        with self._lock:
+            entry = self._entries.get(_id)
+            if entry and entry[0] == last_updated and name not in entry[4]:
+                entry[4][name] = content
+                self.used += len(content)
+                self._evict()
+
+    def invalidate(self, _id):
+        with self._lock:
+            self._remove(_id)
+
+    def _estimate(self, raw):
+        return len(raw) * (1 + self.DECODED_FACTOR)
+
+    def _size(self, entry):
+        return self._estimate(entry[1]) + sum(map(len, entry[4].values()))
+
+    def _remove(self, _id):
+        entry = self._entries.pop(_id, None)
+        if entry:
+            self.used -= self._size(entry)
+
+    def _evict(self):
+        while self.used > self.size:
+            _, entry = self._entries.popitem(last=False)
+            self.used -= self._size(entry)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "used": self.used,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+documents = DocumentCache(int(os.getenv('DOCUMENT_CACHE_SIZE', 64 * 1024 * 1024)))
+
+
 class Slug():
     """
         Optional secondary key for a DB entry.
@@ -337,7 +722,7 @@ class Slug():
         if value != value.lower():
             raise ValueError("Slug must be in lowercase.")
 
-        if value in ('www', 'dev', 'smart-api', 'api'):
+        if value in SlugRegistry.RESERVED:
             raise ValueError(f"Slug '{value}' is reserved.")
 
         _valid_chars = string.ascii_letters + string.digits + "-_~"
@@ -370,6 +755,12 @@ class SmartAPI(AbstractWebEntity, Mapping):
         self._raw = None
         self._data = {}
 
+        # 'json' or 'yaml', detected
+        self.raw_format = None
+
+        # saved without _meta fields added since
+        self._outdated_meta = False
+
     @property
     def raw(self):
         """
@@ -384,7 +775,7 @@ class SmartAPI(AbstractWebEntity, Mapping):
         if not value:
             raise ControllerError("Empty value.")
         try:
-            self._data = decoder.to_dict(value)
+            self._data, self.raw_format = decoder.load(value, self.raw_format)
         except (ValueError, TypeError) as err:
             raise ControllerError(str(err)) from err
         else:  # dict conversion success
@@ -432,6 +823,29 @@ class SmartAPI(AbstractWebEntity, Mapping):
 
         return APIDoc.exists(val, field)
 
+    @classmethod
+    def find_many(cls, vals, field='slug'):
+        """
+        Find SmartAPIs by a list of values of a field.
+        Return the first _id or None for each value.
+        """
+        if field in ('slug', 'username', 'url'):
+            field = '_meta.' + field
+
+        return APIDoc.exists_many(vals, field)
+
+    @classmethod
+    async def exists_async(cls, _id):
+        return bool(await APIDoc.exists_async(_id))
+
+    @classmethod
+    async def find_async(cls, val, field='slug'):
+
+        if field in ('slug', 'username', 'url'):
+            field = '_meta.' + field
+
+        return await APIDoc.exists_async(val, field)
+
     @classmethod
     def get(cls, _id):
 
@@ -440,11 +854,68 @@ class SmartAPI(AbstractWebEntity, Mapping):
         except ESNotFoundError as err:
             raise NotFoundError from err
 
+        return cls._from_doc(doc)
+
+    @classmethod
+    async def get_async(cls, _id):
+
+        try:
+            doc = await APIDoc.get_async(_id)
+        except ESNotFoundError as err:
+            raise NotFoundError from err
+
+        return cls._from_doc(doc)
+
+    @classmethod
+    async def get_version_async(cls, _id):
+        """
+        Return the raw content digest and the last updated
+        time of a document, without loading its content.
+        """
+        try:
+            doc = await APIDoc.get_async(_id, _source_includes=['_meta'])
+        except ESNotFoundError as err:
+            raise NotFoundError from err
+
+        return doc._meta.raw_hash, doc._meta.last_updated
+
+    @classmethod
+    async def get_raw_async(cls, _id):
+        """
+        Return the raw content of a document as stored,
+        compressed, its format, and its version, the
+        (raw_hash, last_updated) pair, without decoding.
+        """
+        try:
+            doc = await APIDoc.get_async(_id, _source_includes=['_meta', '_raw'])
+        except ESNotFoundError as err:
+            raise NotFoundError from err
+
+        version = (doc._meta.raw_hash, doc._meta.last_updated)
+        return doc._raw, doc._meta.raw_format, version
+
+    @classmethod
+    def _from_doc(cls, doc, cache=True):
+        """
+        Create a SmartAPI from a database document, through the
+        document cache, unless cache is False, like for reading
+        all documents, not to evict the frequently used ones.
+        """
         obj = cls(doc._meta.url)
-        obj.raw = decoder.decompress(doc._raw)
+        cached = cache and documents.get(obj._id, doc._meta.last_updated)
+        if cached:  # skip decompression and parsing
+            obj._raw, obj._data, obj.raw_format = cached
+        else:
+            obj.raw_format = doc._meta.raw_format  # skip detection
+            obj.raw = decoder.decompress(doc._raw)
+            if cache:
+                documents.put(
+                    obj._id, doc._meta.last_updated,
+                    obj._raw, obj._data, obj.raw_format)
 
         obj.username = doc._meta.username
         obj.slug = doc._meta.slug
+        obj._outdated_meta = not (doc._meta.raw_hash and doc._meta.raw_format)
 
         obj.date_created = doc._meta.date_created
         obj.last_updated = doc._meta.last_updated
@@ -456,7 +927,13 @@ class SmartAPI(AbstractWebEntity, Mapping):
 
         obj.webdoc = APIRefreshStatus(
             obj, doc._status.refresh_status,
-            doc._status.refresh_ts
+            doc._status.refresh_ts, (
+                doc._status.validation_key,
+                doc._status.validation_passed
+            ), (
+                doc._status.refresh_etag,
+                doc._status.refresh_last_modified
+            )
         )
 
         return obj
@@ -486,6 +963,9 @@ class SmartAPI(AbstractWebEntity, Mapping):
         except ValueError as err:
             raise ControllerError(str(err)) from err
 
+        if self.raw:  # skip revalidation on refresh
+            self.webdoc.cache(self.raw, True)
+
         return doc
 
     def check(self):
@@ -499,16 +979,32 @@ class SmartAPI(AbstractWebEntity, Mapping):
         self.uptime.update(api.api_status)
         return api.api_status
 
+    async def check_async(self, limiter=None, timeout=60):
+        """
+        Check the endpoints concurrently, within timeout seconds,
+        counted from when the first call gets a slot from the limiter.
+        Share the limiter to limit connections across documents.
+        """
+        doc = dict(self)
+        doc['_id'] = self._id
+
+        api = monitor.API(doc)
+        await api.check_api_status_async(limiter, timeout)
+
+        self.uptime.update(api.api_status)
+        return api.api_status
+
     def refresh(self, file=None):
 
         if file is None:  # blocking network operation
-            file = download(self.url, raise_error=False)
+            file = download(
+                self.url, raise_error=False,
+                **self.webdoc.conditions)
 
         self.webdoc.update(file)
         return self.webdoc.status
 
-    def save(self):
-        # TODO DOCSTRING
+    def _to_doc(self):
 
         if not self.raw:
             raise ControllerError("No content.")
@@ -542,16 +1038,6 @@ class SmartAPI(AbstractWebEntity, Mapping):
         _doc = self._validate_dispatch()
         _doc.clean()  # only keep indexing fields
 
-        if self.slug:
-            _id = self.find(self.slug)
-            if _id and _id != self._id:  # another doc same slug.
-                raise ConflictError("Slug is already registered.")
-
-        # NOTE
-        # if the slug of another document changed at this point
-        # it's possible to have two documents with the same slug
-        # registered. but it should be rare enough in reality.
-
         doc = APIDoc(**_doc)
         doc.meta.id = self._id
 
@@ -561,18 +1047,130 @@ class SmartAPI(AbstractWebEntity, Mapping):
 
         doc._meta.date_created = self.date_created
         doc._meta.last_updated = self.last_updated
+        doc._meta.raw_hash = digest(self.raw)
+        doc._meta.raw_format = self.raw_format
 
-        doc._status.uptime_status = self.uptime.status
-        doc._status.uptime_ts = self.uptime.timestamp
-
-        doc._status.refresh_status = self.webdoc.status
-        doc._status.refresh_ts = self.webdoc.timestamp
+        for key, value in self._to_status().items():
+            setattr(doc._status, key, value)
 
         doc._raw = decoder.compress(self.raw)
+
+        return doc
+
+    def _to_status(self):
+
+        return {
+            "uptime_status": self.uptime.status,
+            "uptime_ts": self.uptime.timestamp,
+
+            "refresh_status": self.webdoc.status,
+            "refresh_ts": self.webdoc.timestamp,
+
+            "validation_key": self.webdoc.validation[0],
+            "validation_passed": self.webdoc.validation[1],
+
+            "refresh_etag": self.webdoc.conditions['etag'],
+            "refresh_last_modified": self.webdoc.conditions['last_modified']
+        }
+
+    def _to_partial(self):
+        """
+        The fields of a status change, the _status field,
+        and the _meta fields the document was saved without,
+        filled in, so that they do not wait for a content change.
+        """
+        doc = {"_status": self._to_status()}
+        if self._outdated_meta:
+            doc["_meta"] = {
+                "raw_hash": digest(self.raw),
+                "raw_format": self.raw_format
+            }
+        return doc
+
+    def _check_slug(self, _id):
+        """
+        Raise ConflictError if the slug is registered
+        by another document, found by self.find(slug).
+        """
+        if _id and _id != self._id:  # another doc same slug.
+            raise ConflictError("Slug is already registered.")
+
+        # NOTE
+        # if the slug of another document changed at this point
+        # it's possible to have two documents with the same slug
+        # registered. but it should be rare enough in reality.
+
+    def save(self):
+        # TODO DOCSTRING
+
+        doc = self._to_doc()
+
+        if self.slug:
+            self._check_slug(self.find(self.slug))
+
         doc.save()
+        slugs.update(self._id, self.slug)
+        documents.invalidate(self._id)
+        return self._id
+
+    async def save_async(self):
 
+        doc = self._to_doc()
+
+        if self.slug:
+            self._check_slug(await self.find_async(self.slug))
+
+        await doc.save_async()
+        slugs.update(self._id, self.slug)
+        documents.invalidate(self._id)
         return self._id
 
+    @classmethod
+    def bulk_save(cls, smartapis):
+        """
+        Save documents in a few bulk requests.
+        Skip the slug check, for documents already
+        saved whose slugs have not changed since.
+        Return (number saved, list of errors).
+        """
+        actions, errors = [], []
+        for smartapi in smartapis:
+            try:
+                doc = smartapi._to_doc()
+                doc.full_clean()
+            except (ControllerError, ValueError) as err:
+                errors.append({'_id': smartapi._id, 'error': str(err)})
+            else:
+                actions.append(doc.to_dict(include_meta=True))
+                documents.invalidate(smartapi._id)
+
+        saved, _errors = APIDoc.bulk(actions)
+        return saved, errors + _errors
+
+    def save_status(self):
+        """
+        Save only the _status field, for uptime and refresh
+        status changes, without validating and reindexing
+        the whole document. Raise NotFoundError if not saved.
+        Fill in missing _meta fields of older documents.
+        """
+        try:
+            APIDoc.update_partial(self._id, self._to_partial())
+        except ESNotFoundError as err:
+            raise NotFoundError from err
+
+    @classmethod
+    def bulk_save_status(cls, smartapis):
+        """
+        Save only the _status field of the documents,
+        in a few bulk requests. Return (number saved, list of errors).
+        """
+        return APIDoc.bulk({
+            "_op_type": "update",
+            "_id": smartapi._id,
+            "doc": smartapi._to_partial()
+        } for smartapi in smartapis)
+
     @classmethod
     def get_all(cls, size=10, from_=0):
         """
@@ -580,16 +1178,35 @@ class SmartAPI(AbstractWebEntity, Mapping):
         Size is the at-most number.
         """
         search = APIDoc.search()
-        search = search.source(False)
+        search = search.source(['_meta', '_status', '_raw'])
         search = search[from_: from_ + size]
 
-        for hit in search:
-            try:  # unlikely but possible
-                doc = cls.get(hit.meta.id)
-            except ESNotFoundError:
-                pass  # inconsistent
-            else:  # consistent
-                yield doc
+        for hit in search:  # in one request
+            yield cls._from_doc(hit)
+
+    @classmethod
+    def get_all_versions(cls, size=10, from_=0):
+        """
+        Return the raw content digest and the last updated time
+        of the documents in get_all, without loading their content.
+        """
+        search = APIDoc.search()
+        search = search.source(['_meta.raw_hash', '_meta.last_updated'])
+        search = search[from_: from_ + size]
+
+        return [(hit._meta.raw_hash, hit._meta.last_updated) for hit in search]
+
+    @classmethod
+    def iterate(cls, page_size=100):
+        """
+        Iterate over all SmartAPIs.
+        Load page_size documents at a time.
+        """
+        search = APIDoc.search()
+        search = search.source(['_meta', '_status', '_raw'])
+
+        for hit in APIDoc.iterate(search, page_size):
+            yield cls._from_doc(hit, cache=False)
 
     @staticmethod
     def get_tags(field='info.contact.name'):
@@ -614,8 +1231,46 @@ class SmartAPI(AbstractWebEntity, Mapping):
         except ESNotFoundError as err:
             raise NotFoundError() from err
 
+        slugs.remove(self._id)
+        documents.invalidate(self._id)
         return self._id
 
+    async def delete_async(self):
+
+        try:
+            await APIDoc.delete_async(self._id)
+        except ESNotFoundError as err:
+            raise NotFoundError() from err
+
+        slugs.remove(self._id)
+        documents.invalidate(self._id)
+        return self._id
+
+    def serialize(self, fmt='json', compress=False):
+        """
+        Return the document serialized as 'json' or 'yaml'
+        bytes, optionally gzip compressed. Cached with this
+        version of the document if it is cached.
+        """
+        name = fmt + ('.gz' if compress else '')
+        content = documents.get_view(self._id, self.last_updated, name)
+        if content is not None:
+            return content
+
+        if compress:
+            content = gzip.compress(self.serialize(fmt))
+        elif fmt == 'json':
+            content = json.dumps(self._data, default=_isoformat).encode()
+        elif fmt == 'yaml':
+            content = yaml.dump(
+                self._data, Dumper=yaml.SafeDumper,
+                default_flow_style=False).encode()
+        else:
+            raise ValueError(f"Unsupported format {fmt}.")
+
+        documents.put_view(self._id, self.last_updated, name, content)
+        return content
+
     # READ-ONLY DICT-LIKE ACCESS
     # FOR FIRST LEVEL KEYS
 
@@ -627,3 +1282,14 @@ class SmartAPI(AbstractWebEntity, Mapping):
 
     def __len__(self):
         return len(self._data)
+
+
+def decode_and_validate(url, raw):
+    """
+        Create a SmartAPI from raw bytes and validate it.
+        Module-level so it can run in a worker process.
+    """
+    smartapi = SmartAPI(url)
+    smartapi.raw = raw
+    smartapi.validate()
+    return smartapi
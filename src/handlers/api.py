@@ -5,17 +5,22 @@ Validation /api/validate
 Metadata /api/metadata
 Suggestion /api/suggestion
 """
+import asyncio
 import json
 import logging
+from email.utils import parsedate_to_datetime
 
 import certifi
 from biothings.web.handlers import BaseAPIHandler
 from biothings.web.handlers.exceptions import BadRequest
-from controller import ControllerError, NotFoundError, SmartAPI
+from controller import ControllerError, NotFoundError, SmartAPI, decode_and_validate, digest
 from tornado.httpclient import AsyncHTTPClient
 from tornado.web import Finish, HTTPError
 from torngithub import json_encode
+from utils import decoder
 from utils.downloader import DownloadError, download_async
+from utils.executor import BoundedExecutor, QueueFull
+from utils.schemas import SchemaStoreError
 from utils.notification import SlackNewAPIMessage, SlackNewTranslatorAPIMessage
 
 
@@ -74,11 +79,41 @@ class BaseHandler(BaseAPIHandler):
         # DEBUG USAGE
         # return {"login": "tester"}
 
+    _executor = None  # shared by all handlers
+
+    @property
+    def executor(self):
+        if BaseHandler._executor is None:
+            BaseHandler._executor = BoundedExecutor(
+                getattr(self.web_settings, 'VALIDATION_WORKERS', 0),
+                getattr(self.web_settings, 'VALIDATION_QUEUE', 0))
+        return BaseHandler._executor
+
+    async def decode_and_validate(self, url, raw):
+        """
+        Create a SmartAPI from raw bytes and validate it,
+        in a worker process if configured. Respond 429
+        when there are too many documents in progress,
+        503 when the validation schemas are unavailable.
+        """
+        try:
+            return await self.executor.submit(decode_and_validate, url, raw)
+        except QueueFull:
+            raise HTTPError(429)
+        except SchemaStoreError as err:
+            logging.error(err)
+            raise HTTPError(503, reason="Validation schemas unavailable.")
+
 
 class ValidateHandler(BaseHandler):
     """
     Validate Swagger/OpenAPI document.
     Accepts URL in form data, JSON/YAML body.
+
+    Batch mode, respond one JSON result per line,
+    in the order the validations complete:
+        JSON array body of document URLs.
+        NDJSON body of documents, one per line.
     """
 
     name = "validator"
@@ -88,8 +123,24 @@ class ValidateHandler(BaseHandler):
         }
     }
 
+    MAX_BATCH_SIZE = 100
+
     async def post(self):
 
+        if 'ndjson' in self.request.headers.get('Content-Type', ''):
+            docs = [line for line in self.request.body.splitlines() if line.strip()]
+            await self.post_batch(raws=docs)
+            return
+
+        if self.request.body.lstrip().startswith(b'['):
+            try:
+                urls = json.loads(self.request.body)
+                assert all(isinstance(url, str) for url in urls)
+            except (ValueError, AssertionError):
+                raise BadRequest(details="Expect a JSON array of URLs.")
+            await self.post_batch(urls=urls)
+            return
+
         if self.args.url:
 
             try:
@@ -103,10 +154,7 @@ class ValidateHandler(BaseHandler):
             raw = self.request.body
 
         try:
-            smartapi = SmartAPI(SmartAPI.VALIDATION_ONLY)
-            smartapi.raw = raw
-            smartapi.validate()
-
+            smartapi = await self.decode_and_validate(SmartAPI.VALIDATION_ONLY, raw)
         except (ControllerError, AssertionError) as err:
             raise BadRequest(details=str(err))
         else:
@@ -115,6 +163,41 @@ class ValidateHandler(BaseHandler):
                 'details': f'Valid {smartapi.version} metadata.'
             })
 
+    async def post_batch(self, urls=(), raws=()):
+
+        if len(urls) + len(raws) > self.MAX_BATCH_SIZE:
+            raise BadRequest(details=f"At most {self.MAX_BATCH_SIZE} documents.")
+
+        # leave room in the pool for other requests
+        semaphore = asyncio.Semaphore(max(self.executor.workers - 1, 1))
+
+        async def validate(index, url=None, raw=None):
+            result = {'index': index}
+            if url:
+                result['url'] = url
+            try:
+                if url:  # downloads are not limited
+                    file = await download_async(url)
+                    raw = file.raw
+                async with semaphore:
+                    smartapi = await self.decode_and_validate(SmartAPI.VALIDATION_ONLY, raw)
+            except (DownloadError, ControllerError, AssertionError, ValueError) as err:
+                result.update(success=False, details=str(err))  # ValueError: url scheme
+            except HTTPError as err:  # 429, 503
+                result.update(success=False, details=err.reason or "Too many documents in progress.")
+            else:
+                result.update(success=True, details=f'Valid {smartapi.version} metadata.')
+            return result
+
+        tasks = [validate(index, url=url) for index, url in enumerate(urls)]
+        tasks += [validate(index, raw=raw) for index, raw in enumerate(raws)]
+
+        self.set_header('Content-Type', 'application/x-ndjson')
+        for task in asyncio.as_completed(tasks):
+            self.write(json.dumps(await task) + '\n')
+            await self.flush()
+        self.finish()
+
 
 class APIHandler(BaseHandler):
     """
@@ -140,23 +223,148 @@ class APIHandler(BaseHandler):
 
     name = "smartapi"
 
-    def get(self, _id=None):
+    async def get(self, _id=None):
         """
         Get one API or ALL
         """
         if _id is None:
-            docs = SmartAPI.get_all(
+            if self.is_conditional():
+                self.finish_if_cached(SmartAPI.get_all_versions(
+                    from_=self.args.from_,
+                    size=self.args.size), many=True)
+            docs = list(SmartAPI.get_all(
                 from_=self.args.from_,
-                size=self.args.size)
+                size=self.args.size))
+            self.finish_if_cached([
+                (digest(doc.raw), doc.last_updated)
+                for doc in docs
+            ], many=True)
             raise Finish([dict(doc) for doc in docs])
 
+        if self.args.format == 'raw':
+            await self.get_raw(_id)
+            return
+
+        encoding = None
+        if self.args.format in self.SERIALIZED_CONTENT_TYPES and self.accepts_gzip():
+            encoding = 'gzip'
+
+        try:
+            if self.is_conditional():
+                self.finish_if_cached([await SmartAPI.get_version_async(_id)], encoding)
+            doc = await SmartAPI.get_async(_id)
+        except NotFoundError:
+            raise HTTPError(404)
+        else:
+            self.finish_if_cached([(digest(doc.raw), doc.last_updated)], encoding)
+            if self.args.format in self.SERIALIZED_CONTENT_TYPES:
+                self.finish_serialized(doc, self.args.format)
+            else:  # html, msgpack
+                self.format = self.args.format
+                self.finish(dict(doc))
+
+    SERIALIZED_CONTENT_TYPES = {
+        'json': 'application/json; charset=UTF-8',
+        'yaml': 'text/x-yaml; charset=UTF-8'
+    }
+
+    def finish_serialized(self, doc, fmt):
+        """
+        Respond with the cached serialization of the document,
+        gzip compressed for clients accepting it.
+        """
+        compress = self.accepts_gzip()
+        self.set_header('Content-Type', self.SERIALIZED_CONTENT_TYPES[fmt])
+        self.set_header('Vary', 'Accept-Encoding')
+        if compress:
+            self.set_header('Content-Encoding', 'gzip')
+        self.finish(doc.serialize(fmt, compress))
+
+    RAW_CONTENT_TYPES = {
+        'json': 'application/json',
+        'yaml': 'text/yaml'
+    }
+
+    async def get_raw(self, _id):
+        """
+        Respond with the original document, as stored.
+        Send gzip compressed content as is, to clients
+        accepting it, decompress it for the others.
+        """
         try:
-            doc = SmartAPI.get(_id)
+            blob, fmt, version = await SmartAPI.get_raw_async(_id)
         except NotFoundError:
             raise HTTPError(404)
+
+        encoding = None
+        if blob and blob.startswith(decoder.GZIP_MAGIC) and self.accepts_gzip():
+            encoding = 'gzip'
+
+        self.finish_if_cached([version], encoding)
+        self.set_header('Content-Type', self.RAW_CONTENT_TYPES.get(fmt, 'text/plain'))
+        self.set_header('Vary', 'Accept-Encoding')
+
+        if not blob:
+            self.finish()
+            return
+
+        if encoding:
+            self.set_header('Content-Encoding', encoding)
+            self.finish(blob)
+            return
+
+        for chunk in decoder.iter_decompress(blob):
+            self.write(chunk)
+            await self.flush()
+        self.finish()
+
+    def accepts_gzip(self):
+        return 'gzip' in self.request.headers.get('Accept-Encoding', '')
+
+    def is_conditional(self):
+        return any(header in self.request.headers for header in (
+            'If-None-Match', 'If-Modified-Since'
+        ))
+
+    def finish_if_cached(self, versions, encoding=None, many=False):
+        """
+        Set the ETag and Last-Modified headers from the
+        (raw_hash, last_updated) pairs of the documents in
+        the response, sent with the content-coding encoding,
+        None for identity. Finish with 304 Not Modified if the
+        client has the current version. For many documents,
+        only the ETag tells removed or reordered ones, so
+        only it is set.
+        """
+        hashes = [_hash for _hash, _ in versions]
+        if hashes and all(hashes):  # representation specific
+            tags = [self.args.format, encoding or 'identity']
+            etag = digest(' '.join(tags + hashes).encode())
+            self.set_header('ETag', f'"{etag}"')
         else:
-            self.format = self.args.format
-            self.finish(dict(doc))
+            self.clear_header('ETag')
+
+        times = [_time for _, _time in versions]
+        modified = max(times) if times and all(times) and not many else None
+        if modified:
+            self.set_header('Last-Modified', modified)
+        else:
+            self.clear_header('Last-Modified')
+
+        if self.request.headers.get('If-None-Match'):
+            cached = self.check_etag_header()
+        elif self.request.headers.get('If-Modified-Since') and modified:
+            try:
+                since = parsedate_to_datetime(self.request.headers['If-Modified-Since'])
+                cached = modified.replace(microsecond=0) <= since
+            except (TypeError, ValueError):
+                cached = False
+        else:
+            cached = False
+
+        if cached:
+            self.set_status(304)
+            raise Finish()
 
     @github_authenticated
     async def post(self):
@@ -164,7 +372,7 @@ class APIHandler(BaseHandler):
         Add an API document
         """
 
-        if SmartAPI.find(self.args.url, "url"):
+        if await SmartAPI.find_async(self.args.url, "url"):
             raise HTTPError(409)
 
         try:
@@ -173,9 +381,7 @@ class APIHandler(BaseHandler):
             raise BadRequest(details=str(err)) from err
 
         try:
-            smartapi = SmartAPI(self.args.url)
-            smartapi.raw = file.raw
-            smartapi.validate()
+            smartapi = await self.decode_and_validate(self.args.url, file.raw)
         except (ControllerError, AssertionError) as err:
             raise BadRequest(details=str(err)) from err
 
@@ -188,7 +394,7 @@ class APIHandler(BaseHandler):
         try:
             smartapi.username = self.current_user['login']
             smartapi.refresh(file)  # populate webdoc meta
-            _id = smartapi.save()
+            _id = await smartapi.save_async()
         except ControllerError as err:
             raise BadRequest(details=str(err)) from err
         else:
@@ -252,7 +458,7 @@ class APIHandler(BaseHandler):
         """
 
         try:
-            smartapi = SmartAPI.get(_id)
+            smartapi = await SmartAPI.get_async(_id)
         except NotFoundError:
             raise HTTPError(404)
 
@@ -263,7 +469,7 @@ class APIHandler(BaseHandler):
 
             try:  # update slug
                 smartapi.slug = self.args.slug or None
-                smartapi.save()
+                await smartapi.save_async()
 
             except (ControllerError, ValueError) as err:
                 raise BadRequest(details=str(err)) from err
@@ -271,9 +477,11 @@ class APIHandler(BaseHandler):
             self.finish({'success': True})
 
         else:  # refresh
-            file = await download_async(smartapi.url, raise_error=False)
+            file = await download_async(
+                smartapi.url, raise_error=False,
+                **smartapi.webdoc.conditions)
             code = smartapi.refresh(file)
-            smartapi.save()
+            await smartapi.save_async()
 
             try:
                 status = smartapi.webdoc.STATUS(code)
@@ -288,13 +496,13 @@ class APIHandler(BaseHandler):
             })
 
     @github_authenticated
-    def delete(self, _id):
+    async def delete(self, _id):
         """
         Delete API
         """
 
         try:
-            smartapi = SmartAPI.get(_id)
+            smartapi = await SmartAPI.get_async(_id)
         except NotFoundError:
             raise HTTPError(404)
 
@@ -302,7 +510,7 @@ class APIHandler(BaseHandler):
             raise HTTPError(403)
 
         try:
-            _id = smartapi.delete()
+            _id = await smartapi.delete_async()
         except ControllerError as err:
             raise BadRequest(details=str(err)) from err
 
@@ -14,7 +14,7 @@ from jinja2 import Environment, FileSystemLoader
 from tornado.httputil import url_concat
 from torngithub import json_decode, json_encode
 
-from controller import SmartAPI
+from controller import slugs
 
 log = logging.getLogger("smartapi")
 
@@ -47,9 +47,9 @@ class BaseHandler(BioThingsBaseHandler):
 class MainHandler(BaseHandler):
     def get(self):
         slug = self.request.host.split(".")[0]
-        if slug and slug.lower() not in ['www', 'dev', 'smart-api', 'localhost:8000']:
+        if slug:
             try:
-                api_id = SmartAPI.find(slug)
+                api_id = slugs.get(slug)
                 if api_id:
                     swaggerUI_file = "smartapi-ui.html"
                     swagger_template = templateEnv.get_template(swaggerUI_file)
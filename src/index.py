@@ -7,6 +7,7 @@ from biothings.web.index_base import main
 from tornado.ioloop import IOLoop
 
 from admin import routine
+from controller import slugs
 from handlers.frontend import APP_LIST
 from utils.indices import setup
 
@@ -16,8 +17,15 @@ def run_routine():
     thread.start()
 
 
+def load_slugs():
+    thread = Thread(target=slugs.load, daemon=True)
+    thread.start()
+
+
 if __name__ == '__main__':
 
     crontab('0 0 * * *', func=run_routine, start=True)
+    crontab('*/10 * * * *', func=load_slugs, start=True)
     IOLoop.current().add_callback(setup)
+    IOLoop.current().add_callback(load_slugs)
     main(APP_LIST, use_curl=True)
@@ -1,60 +1,208 @@
+"""
+    Migrate the documents of the previous registry.
+
+    Read the origin index in slices, in parallel, each in
+    a worker process, and index the documents in bulk.
+    Completed slices are recorded in a checkpoint file,
+    to resume an interrupted migration where it stopped.
+    Then update the documents with the concurrent refresh
+    and uptime check jobs of the admin module.
+
+        python migrate.py
+
+"""
 import base64
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timezone
+from itertools import islice
 
 from dateutil import parser
 from elasticsearch.client import Elasticsearch
 from elasticsearch.helpers import scan
+from elasticsearch_dsl import connections
 
-from controller import SmartAPI
+import admin
+from controller import ControllerError, SmartAPI
+from model import ES_HOST, APIDoc
 from utils import decoder, indices
 
 ES_ORIGIN = "http://smart-api.info:9200"
 ES_DESTINATION = "http://localhost:9200"  # CANNOT CHANGE THIS
 
+CHECKPOINT = "migrate.checkpoint.json"
+
+
+def _prepare(doc):
+    """
+    Build the index action of an origin document.
+    Return the action or raise an error of _MALFORMED.
+    """
+    url = doc['_source']['_meta']['url']
+    raw = decoder.decompress(base64.urlsafe_b64decode(doc['_source']['~raw']))
+
+    smartapi = SmartAPI(url)
+    smartapi.raw = raw
+    smartapi.date_created = parser.parse(doc['_source']['_meta']['timestamp']).replace(tzinfo=timezone.utc)
+    smartapi.username = doc['_source']['_meta']['github_username']
+    smartapi.slug = doc['_source']['_meta'].get('slug')
 
-def migrate():
+    _doc = smartapi._to_doc()
+    _doc.full_clean()
+    return _doc.to_dict(include_meta=True)
 
-    for doc in scan(
+
+# errors of a malformed document, with corrupted
+# content, a non-http url, or missing fields.
+_MALFORMED = (
+    ControllerError, AssertionError, AttributeError,
+    KeyError, TypeError, ValueError, EOFError, OSError
+)
+
+
+def _connect():
+    # the connections of the parent process are
+    # copied when forking, with their sockets.
+    connections.create_connection(hosts=ES_HOST)
+
+
+def _migrate_slice(slice_id, slices, batch_size):
+    """
+    Index the documents of one slice of the origin index.
+    Run in worker processes. Return the report.
+    """
+    report = Counter()
+    docs = scan(
         Elasticsearch(ES_ORIGIN),
-        query={"query": {"match_all": {}}},
+        query={
+            "slice": {"id": slice_id, "max": slices},
+            "query": {"match_all": {}}
+        },
         index="smartapi_oas3",
         doc_type="api"
-    ):
-        print(doc["_id"])
-        if not doc['_source']['_meta'].get('_archived'):
-            url = doc['_source']['_meta']['url']
-            raw = decoder.decompress(base64.urlsafe_b64decode(doc['_source']['~raw']))
+    )
+    while True:
+        batch = list(islice(docs, batch_size))
+        if not batch:
+            break
+        actions = []
+        for doc in batch:
+            if doc['_source']['_meta'].get('_archived'):
+                report['archived'] += 1
+                continue
+            try:
+                actions.append(_prepare(doc))
+            except _MALFORMED as err:
+                logging.error("%s: %s", doc["_id"], str(err) or type(err).__name__)
+                report['failed'] += 1
+        saved, errors = APIDoc.bulk(actions)
+        for error in errors:
+            logging.error(error)
+        report['saved'] += saved
+        report['failed'] += len(errors)
+    return report
 
-            smartapi = SmartAPI(url)
-            smartapi.raw = raw
-            smartapi.date_created = parser.parse(doc['_source']['_meta']['timestamp']).replace(tzinfo=timezone.utc)
-            smartapi.username = doc['_source']['_meta']['github_username']
-            smartapi.slug = doc['_source']['_meta'].get('slug')
-            smartapi.save()
-    print()
 
+def _read_checkpoint(checkpoint, slices):
+    if not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint, 'r') as file:
+        state = json.load(file)
+    if state['slices'] != slices:
+        raise ValueError(f"Checkpoint of {state['slices']} slices, not {slices}.")
+    return set(state['done'])
 
-def update():
 
-    for doc in scan(
-        Elasticsearch(ES_DESTINATION),
-        query={"query": {"match_all": {}}},
-        index="smartapi_docs",
-        scroll="60m"
-    ):
-        print(doc["_id"])
-        smartapi = SmartAPI.get(doc["_id"])
-        print(smartapi.check())
-        print(smartapi.refresh())
+def _write_checkpoint(checkpoint, slices, done):
+    with open(checkpoint + '.tmp', 'w') as file:
+        json.dump({"slices": slices, "done": sorted(done)}, file)
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+
+def migrate(slices=8, workers=None, checkpoint=CHECKPOINT, batch_size=500):
+    """
+    Index the documents of the origin index, skipping archived ones,
+    read in slices by os.cpu_count() workers by default, zero to run
+    in this process. Skip the slices completed in the checkpoint, kept
+    until all slices are. Slugs are not checked for duplicates.
+    """
+    done = _read_checkpoint(checkpoint, slices)
+    pending = [n for n in range(slices) if n not in done]
+    if done:
+        logging.info("Resume from %s, %s slices remaining.", checkpoint, len(pending))
+
+    indices.setup()
+    indices.refresh_interval("-1")
+
+    _t0 = time.perf_counter()
+    report = Counter()
+    pool = ProcessPoolExecutor(workers, initializer=_connect) if workers != 0 else None
+    futures = {}
+    try:
+        if pool:
+            futures = {
+                pool.submit(_migrate_slice, n, slices, batch_size): n
+                for n in pending
+            }
+            results = ((futures[f], f.result()) for f in as_completed(futures))
+        else:
+            results = ((n, _migrate_slice(n, slices, batch_size)) for n in pending)
+        for slice_id, _report in results:
+            report.update(_report)
+            done.add(slice_id)
+            _write_checkpoint(checkpoint, slices, done)
+            logging.info("Slice %s/%s: %s", slice_id + 1, slices, dict(_report))
+    finally:
+        for future in futures:
+            future.cancel()  # if not started
+        if pool:
+            pool.shutdown()
+        indices.refresh_interval(None)
+        indices.refresh()
+
+    os.remove(checkpoint)
+    seconds = time.perf_counter() - _t0
+    logging.info(
+        "Migrated %s documents in %.1fs, %.1f/s, %s archived, %s failed.",
+        report['saved'], seconds, report['saved'] / max(seconds, 1e-3),
+        report['archived'], report['failed'])
+    return report
+
+
+def _save_refreshed(smartapis):
+    # like admin._save_refreshed, updated documents saved
+    # in full, but as not modified, the change not reliable
+    # during migration, the others, only their status.
+    updated, others = [], []
+    for smartapi in smartapis:
         if smartapi.webdoc.status == 299:
-            smartapi.webdoc._status = 200  # change status not reliable during migration
-        smartapi.save()
-    print()
+            smartapi.webdoc._status = 200
+            updated.append(smartapi)
+        else:
+            others.append(smartapi)
+    saved, errors = SmartAPI.bulk_save(updated) if updated else (0, [])
+    _saved, _errors = SmartAPI.bulk_save_status(others) if others else (0, [])
+    return saved + _saved, errors + _errors
+
+
+def update():
+    """
+    Refresh the documents from their urls and check their uptime,
+    concurrently, saving the results in bulk.
+    """
+    admin.refresh_document(save=_save_refreshed)
+    admin.check_uptime()
+    indices.refresh()
 
 
 if __name__ == "__main__":
-    input('Will reset smartapi_docs index. Ctrl-C to cancel.')
-    indices.reset()
+    logging.basicConfig(level=logging.INFO)
+    if not os.path.exists(CHECKPOINT):
+        input('Will reset smartapi_docs index. Ctrl-C to cancel.')
+        indices.reset()
     migrate()
-    indices.refresh()
     update()
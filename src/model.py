@@ -1,10 +1,12 @@
 """
     Elasticsearch Document Object Model
 """
+import asyncio
 import os
 
 # pylint: disable=wildcard-import
 # pylint: disable=unused-wildcard-import
+from elasticsearch import helpers
 from elasticsearch_dsl import *
 
 
@@ -16,6 +18,28 @@ ES_INDEX_NAME = 'smartapi_docs'
 connections.create_connection(hosts=ES_HOST)
 
 
+# the async client and the event loop it is bound to,
+# replaced when used in another loop, like in later
+# asyncio.run calls, the previous loop being closed.
+_async_connection = (None, None)
+
+
+def async_connection():
+    """
+    Return the async connection of the current event loop.
+    Create it on first use in the loop. One loop at a time.
+    """
+    global _async_connection  # pylint: disable=global-statement
+
+    # only required for async access
+    from elasticsearch_async import AsyncElasticsearch  # pylint: disable=import-outside-toplevel
+
+    loop = asyncio.get_event_loop()
+    if _async_connection[0] is not loop:
+        _async_connection = (loop, AsyncElasticsearch(hosts=ES_HOST))
+    return _async_connection[1]
+
+
 class UserMeta(InnerDoc):
     """ The _meta field. """
     url = Keyword(required=True)
@@ -23,6 +47,8 @@ class UserMeta(InnerDoc):
     username = Keyword(required=True)
     date_created = Date(default_timezone='UTC')
     last_updated = Date(default_timezone='UTC')
+    raw_hash = Keyword()  # digest of _raw content
+    raw_format = Keyword()  # json or yaml
 
 
 class StatMeta(InnerDoc):
@@ -34,6 +60,14 @@ class StatMeta(InnerDoc):
     refresh_status = Integer()
     refresh_ts = Date()
 
+    # raw content digest and schema fingerprint
+    validation_key = Keyword()
+    validation_passed = Boolean()
+
+    # headers of the last successful fetch
+    refresh_etag = Keyword()
+    refresh_last_modified = Keyword()
+
 
 class APIDoc(Document):
 
@@ -73,6 +107,11 @@ class APIDoc(Document):
             "mapping.ignore_malformed": True
         }
 
+    @classmethod
+    def _lookup(cls, value, field):
+        search = cls.search().query('match', **{field: value})
+        return search.source(False).extra(size=1, terminate_after=1)
+
     @ classmethod
     def exists(cls, value, field="_id"):
         """
@@ -80,10 +119,127 @@ class APIDoc(Document):
         Data could change after query, use try-catch for
         any follow up operations like Document.get(_id).
         """
-        search = cls.search().query('match', **{field: value})
-        if search.count():
-            return next(iter(search)).meta.id
-        return None
+        if field == "_id":  # HEAD request
+            if cls._get_connection().exists(index=cls.Index.name, id=value):
+                return value
+            return None
+
+        hits = cls._lookup(value, field).execute().hits
+        return hits[0].meta.id if hits else None
+
+    @ classmethod
+    def exists_many(cls, values, field="_id"):
+        """
+        Return a list of the first matching document's _id or None,
+        for each of the values, resolved in a single request.
+        """
+        if not values:
+            return []
+
+        if field == "_id":
+            response = cls._get_connection().mget(
+                index=cls.Index.name, body={"ids": list(values)}, _source=False)
+            return [doc['_id'] if doc.get('found') else None for doc in response['docs']]
+
+        msearch = MultiSearch(index=cls.Index.name)
+        for value in values:
+            msearch = msearch.add(cls._lookup(value, field))
+        return [
+            response.hits[0].meta.id if response.hits else None
+            for response in msearch.execute()
+        ]
+
+    @classmethod
+    def iterate(cls, search=None, page_size=100):
+        """
+        Iterate over all documents matching a search,
+        by default all documents, sorted by url, one page
+        of page_size documents at a time, with search_after.
+        """
+        search = search or cls.search()
+        search = search.sort('_meta.url').extra(size=page_size)
+
+        after = None
+        while True:
+            page = search.extra(search_after=after) if after else search
+            response = page.execute()
+            yield from response
+            if len(response.hits) < page_size:
+                break  # last page
+            after = list(response.hits[-1].meta.sort)
+
+    @classmethod
+    def update_partial(cls, _id, doc):
+        """
+        Update the fields in doc, leaving the others as they are.
+        Fields set to None are cleared, instead of left out.
+        Raise elasticsearch.NotFoundError.
+        """
+        cls._get_connection().update(
+            index=cls.Index.name, id=_id, body={"doc": doc})
+
+    @classmethod
+    def bulk(cls, actions, **kwargs):
+        """
+        Perform index, update and delete actions in bulk,
+        a few requests for any number of actions.
+        Return (number of successes, list of errors).
+        """
+        return helpers.bulk(
+            cls._get_connection(), actions,
+            index=cls.Index.name,
+            raise_on_error=False,
+            **kwargs)
+
+    # ---------------
+    #  Async Access
+    # ---------------
+
+    @classmethod
+    async def get_async(cls, _id, **kwargs):
+        """
+        Retrieve a document by its _id.
+        Raise elasticsearch.NotFoundError.
+        """
+        client = async_connection()
+        response = await client.get(index=cls.Index.name, id=_id, **kwargs)
+        return cls.from_es(response)
+
+    @classmethod
+    async def exists_async(cls, value, field="_id"):
+        """
+        Return the first matching document's _id or None.
+        """
+        client = async_connection()
+
+        if field == "_id":  # HEAD request
+            if await client.exists(index=cls.Index.name, id=value):
+                return value
+            return None
+
+        body = cls._lookup(value, field).to_dict()
+        response = await client.search(index=cls.Index.name, body=body)
+        hits = response['hits']['hits']
+        return hits[0]['_id'] if hits else None
+
+    async def save_async(self):
+        """
+        Index this document, see Document.save.
+        """
+        self.full_clean()
+        client = async_connection()
+        await client.index(
+            index=self.Index.name, id=self.meta.id,
+            body=self.to_dict(skip_empty=True))
+
+    @classmethod
+    async def delete_async(cls, _id):
+        """
+        Delete a document by its _id.
+        Raise elasticsearch.NotFoundError.
+        """
+        client = async_connection()
+        await client.delete(index=cls.Index.name, id=_id)
 
     @ classmethod
     def aggregate(cls, field="tags.name"):
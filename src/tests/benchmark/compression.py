@@ -0,0 +1,66 @@
+"""
+    Compression Benchmark
+
+    Total size, compression and decompression time
+    of the test documents, with gzip, zstd, and zstd
+    with a dictionary trained on the same documents.
+    Train on the registry for representative results:
+
+        python -c "import admin; admin.train_dictionary()"
+
+    Then set ZSTD_DICT_ID to use it here instead.
+    Run from the src folder, requires zstandard:
+
+        python -m tests.benchmark.compression
+
+"""
+import glob
+import os
+import tempfile
+import timeit
+
+from utils import decoder
+
+dirname = os.path.dirname(os.path.dirname(__file__))
+
+DOCS = []
+for pattern in ('*.yml', '*.es.json', 'decoder/doc_*'):
+    for filename in sorted(glob.glob(os.path.join(dirname, pattern))):
+        with open(filename, 'rb') as file:
+            DOCS.append(file.read())
+
+NUMBER = 20
+
+
+def train():
+    decoder.ZSTD_DICT_PATH = tempfile.mkdtemp()
+    samples = [
+        doc[n: n + 4096] for doc in DOCS
+        for n in range(0, len(doc), 1024)
+    ]
+    return decoder.train_dictionary(samples, 16384)
+
+
+def main():
+    dict_id = decoder.ZSTD_DICT_ID or train()
+    print(f"{len(DOCS)} documents, {sum(map(len, DOCS))} bytes")
+    for name, method, _dict_id in (
+        ("gzip", "gzip", None),
+        ("zstd", "zstd", None),
+        ("zstd+dict", "zstd", dict_id)
+    ):
+        streams = [decoder.compress(doc, method, _dict_id) for doc in DOCS]
+        compress = timeit.timeit(lambda: [
+            decoder.compress(doc, method, _dict_id) for doc in DOCS
+        ], number=NUMBER) / NUMBER
+        decompress = timeit.timeit(lambda: [
+            decoder.decompress(stream) for stream in streams
+        ], number=NUMBER) / NUMBER
+        print(
+            f"{name:>9}: {sum(map(len, streams)):>8} bytes, "
+            f"compress {compress * 1000:.2f} ms, "
+            f"decompress {decompress * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
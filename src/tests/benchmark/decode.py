@@ -0,0 +1,60 @@
+"""
+    Decoding Benchmark
+
+    Time to load the test documents to dicts,
+    before, always with the pure Python yaml
+    parser, after, detecting json and using the
+    libyaml parser if available, and reloading
+    with the format detected on the first load.
+
+    Run from the src folder:
+
+        python -m tests.benchmark.decode
+
+"""
+import glob
+import os
+import timeit
+
+import yaml
+
+from utils import decoder
+
+dirname = os.path.dirname(os.path.dirname(__file__))
+
+DOCS = []
+for pattern in ('*.yml', '*.es.json', 'decoder/doc_mydisease.*'):
+    for filename in sorted(glob.glob(os.path.join(dirname, pattern))):
+        with open(filename, 'rb') as file:
+            DOCS.append(file.read())
+
+FORMATS = [decoder.load(doc)[1] for doc in DOCS]
+
+NUMBER = 5
+
+
+def before():
+    for doc in DOCS:
+        yaml.load(doc, Loader=yaml.SafeLoader)
+
+
+def after():
+    for doc in DOCS:
+        decoder.load(doc)
+
+
+def reload():
+    for doc, fmt in zip(DOCS, FORMATS):
+        decoder.load(doc, fmt)
+
+
+def main():
+    print(f"{len(DOCS)} documents, {FORMATS.count('json')} json, "
+          f"libyaml {decoder.YAMLLoader is not yaml.SafeLoader}")
+    for name, func in (("before", before), ("after", after), ("reload", reload)):
+        seconds = timeit.timeit(func, number=NUMBER)
+        print(f"{name:>6}: {seconds / NUMBER * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
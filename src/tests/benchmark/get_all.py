@@ -0,0 +1,66 @@
+"""
+    SmartAPI.get_all Benchmark
+
+    Time to load 1,000 documents, one GET per
+    search hit versus a single search request.
+
+    Run from the src folder, against a local
+    Elasticsearch, resets the smartapi_docs index:
+
+        python -m tests.benchmark.get_all
+
+"""
+import json
+import os
+import time
+
+from elasticsearch.helpers import bulk
+
+from controller import SmartAPI
+from model import APIDoc
+from utils import decoder, indices
+
+dirname = os.path.dirname(os.path.dirname(__file__))
+
+with open(os.path.join(dirname, 'mygene.es.json'), 'r') as file:
+    MYGENE_ES = json.load(file)
+    MYGENE_ES.pop("_id")
+
+with open(os.path.join(dirname, 'mygene.yml'), 'rb') as file:
+    MYGENE_RAW = file.read()
+
+SIZE = 1000
+
+
+def setup():
+    indices.reset()
+    doc = APIDoc(**MYGENE_ES)
+    doc._raw = decoder.compress(MYGENE_RAW)
+    source = doc.to_dict()
+    bulk(APIDoc._get_connection(), (
+        {"_index": APIDoc.Index.name, "_id": str(n), "_source": source}
+        for n in range(SIZE)
+    ))
+    indices.refresh()
+
+
+def get_all_by_id():  # before
+    search = APIDoc.search().source(False)[:SIZE]
+    return [SmartAPI.get(hit.meta.id) for hit in search]
+
+
+def get_all():  # after
+    return list(SmartAPI.get_all(SIZE))
+
+
+def main():
+    setup()
+    for name, func in (("before", get_all_by_id), ("after", get_all)):
+        _t0 = time.perf_counter()
+        assert len(func()) == SIZE
+        print(f"{name:>6}: {time.perf_counter() - _t0:.2f} s")
+
+
+if __name__ == '__main__':
+    input('Will reset smartapi_docs index. Ctrl-C to cancel.')
+    main()
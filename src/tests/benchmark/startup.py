@@ -0,0 +1,41 @@
+"""
+    Cold Start Benchmark
+
+    Time to import the controller and validate
+    the first document, with an empty schema
+    cache (download) and a populated one.
+
+    Run from the src folder:
+
+        python -m tests.benchmark.startup
+
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = (
+    "from controller import SmartAPI;"
+    "smartapi = SmartAPI(SmartAPI.VALIDATION_ONLY);"
+    "smartapi.raw = open('tests/validate/openapi-pass.json', 'rb').read();"
+    "smartapi.validate()"
+)
+
+
+def run(cache):
+    env = dict(os.environ, SCHEMA_CACHE=cache)
+    _t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", SCRIPT], env=env, check=True)
+    return time.perf_counter() - _t0
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache:
+        print(f" no cache: {run(cache):.2f} s")  # populate
+        print(f"   cached: {run(cache):.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+    Validation Benchmark
+
+    Per-document validation time of mygene_full.yml
+    against the openapi schemas, before and after
+    reusing the compiled validators.
+
+    Run from the src folder:
+
+        python -m tests.benchmark.validate
+
+"""
+import os
+import timeit
+
+import jsonschema
+
+from controller import openapis, validate
+from utils import decoder
+
+dirname = os.path.dirname(os.path.dirname(__file__))
+
+with open(os.path.join(dirname, 'mygene_full.yml'), 'rb') as file:
+    MYGENE_FULL = decoder.to_dict(file.read())
+
+NUMBER = 20
+
+
+def uncached():
+    for schema in openapis.values():
+        jsonschema.validate(MYGENE_FULL, schema)
+
+
+def cached():
+    validate(MYGENE_FULL, openapis)
+
+
+def main():
+    cached()  # build validators
+    for name, func in (("before", uncached), ("after", cached)):
+        seconds = timeit.timeit(func, number=NUMBER)
+        print(f"{name:>6}: {seconds / NUMBER * 1000:.2f} ms/doc")
+
+
+if __name__ == '__main__':
+    main()
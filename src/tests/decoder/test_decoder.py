@@ -97,3 +97,52 @@ def test_javascript():
     assert doc["type"] == "object"
     assert "$schema" in doc
     assert "required" in doc
+
+
+def test_gzip():
+    assert decoder.compress(b'') is None
+    assert decoder.decompress(None) is None
+    stream = decoder.compress(YAML, 'gzip')
+    assert stream.startswith(decoder.GZIP_MAGIC)
+    assert decoder.decompress(stream) == YAML
+
+
+def test_zstd(tmp_path, monkeypatch):
+    if not decoder.zstandard:
+        pytest.skip("zstandard not installed")
+
+    stream = decoder.compress(YAML, 'zstd')
+    assert stream.startswith(decoder.ZSTD_MAGIC)
+    assert decoder.decompress(stream) == YAML
+
+    monkeypatch.setattr(decoder, "ZSTD_DICT_PATH", str(tmp_path))
+    samples = [
+        doc[n: n + 1024] for doc in (YAML, JSON, JSTS, SWAGGER)
+        for n in range(0, len(doc), 256)
+    ]
+    dict_id = decoder.train_dictionary(samples, 4096)
+    assert (tmp_path / f"{dict_id}.dict").exists()
+
+    stream = decoder.compress(YAML, 'zstd', dict_id)
+    assert decoder.decompress(stream) == YAML
+    assert len(stream) < len(decoder.compress(YAML, 'zstd'))
+
+    with pytest.raises(ValueError):
+        decoder.compress(YAML, 'bz2')
+
+
+def test_load():
+    assert decoder.load(JSON)[1] == 'json'
+    assert decoder.load(YAML)[1] == 'yaml'
+    assert decoder.load(b'{a: 1}') == ({'a': 1}, 'yaml')  # flow style
+    assert decoder.load(JSON)[0] == decoder.to_yaml(JSON)
+
+    # known format
+    assert decoder.load(JSON, 'json')[1] == 'json'
+    assert decoder.load(YAML, 'json')[1] == 'yaml'  # changed
+    assert decoder.load(JSON, 'yaml')[1] == 'json'  # changed
+    assert decoder.load(b'{a: 1}', 'yaml')[1] == 'yaml'
+    _ok(decoder.load(JSTS, 'yaml')[0])
+
+    with pytest.raises(TypeError):
+        decoder.load(b'[]', 'json')
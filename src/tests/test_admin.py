@@ -0,0 +1,135 @@
+"""
+SmartAPI Backup and Restore Tests
+"""
+import json
+import os
+
+import boto3
+import pytest
+
+import admin
+from controller import SmartAPI
+from model import APIDoc
+from utils import decoder
+from utils.indices import delete, refresh, reset
+from utils.s3 import MultipartUpload
+
+moto = pytest.importorskip("moto")
+mock_s3 = getattr(moto, "mock_s3", None) or moto.mock_aws
+
+dirname = os.path.dirname(__file__)
+
+with open(os.path.join(dirname, 'mygene.es.json'), 'r') as file:
+    MYGENE_ES = json.load(file)
+    MYGENE_ID = MYGENE_ES.pop("_id")
+
+with open(os.path.join(dirname, 'mygene.yml'), 'rb') as file:
+    MYGENE_RAW = file.read()
+
+
+@pytest.fixture(autouse=True)
+def setup_fixture():
+    reset()
+    mygene = APIDoc(meta={'id': MYGENE_ID}, **MYGENE_ES)
+    mygene._raw = decoder.compress(MYGENE_RAW)
+    mygene.save()
+    refresh()
+
+
+@pytest.fixture
+def s3():
+    with mock_s3():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='smartapi')
+        yield client
+
+
+def _check_restored():
+    refresh()
+    mygene = SmartAPI.get(MYGENE_ID)
+    assert mygene.raw == MYGENE_RAW
+    assert mygene.username == MYGENE_ES['_meta']['username']
+
+
+def test_backup_file(tmp_path):
+    filename = str(tmp_path / "backup.ndjson.gz")
+    admin.backup_to_file(filename)
+    delete()
+    admin.restore_from_file(filename)
+    _check_restored()
+
+
+def test_restore_json_file(tmp_path):
+    filename = str(tmp_path / "backup.json")
+    with open(filename, 'w') as file:
+        json.dump(list(admin._backup()), file, indent=2)
+    delete()
+    admin.restore_from_file(filename)
+    _check_restored()
+
+
+def test_restore_bulk():
+    records = list(admin._backup())
+    with open(os.path.join(dirname, 'mygene_invalid.yml'), 'r') as file:
+        records.append(dict(records[0], url="http://example.com/invalid.yml", slug=None, raw=file.read()))
+    records.append({"url": "http://example.com/empty.yml", "raw": ""})
+    records.append(dict(records[0], url="ftp://example.com/mygene.yml"))
+    records.append(dict(records[0], url="http://example.com/null.yml", raw=None))
+    delete()
+
+    report = admin._restore(records, workers=0, batch_size=2)
+    assert report['saved'] == 2
+    assert report['invalid'] == 1  # but restored
+    assert report['failed'] == 3
+    _check_restored()
+    assert SmartAPI.exists(SmartAPI("http://example.com/invalid.yml")._id)
+
+
+def test_backup_s3(s3):
+    admin.backup_to_s3("backup.ndjson.gz")
+    obj = s3.get_object(Bucket='smartapi', Key='db_backup/backup.ndjson.gz')
+    assert obj['Body'].read().startswith(decoder.GZIP_MAGIC)
+    delete()
+    admin.restore_from_s3()  # latest
+    _check_restored()
+
+
+def test_multipart_upload(s3):
+    with MultipartUpload(s3, 'smartapi', 'parts', part_size=5 * 1024 * 1024) as file:
+        for _ in range(11):
+            file.write(b'x' * 1024 * 1024)
+    obj = s3.get_object(Bucket='smartapi', Key='parts')
+    assert obj['ContentLength'] == 11 * 1024 * 1024
+
+    with pytest.raises(ValueError):
+        with MultipartUpload(s3, 'smartapi', 'aborted') as file:
+            file.write(b'x')
+            raise ValueError()
+    assert 'Contents' not in s3.list_objects_v2(Bucket='smartapi', Prefix='aborted')
+
+
+def test_backup_s3_incremental(s3):
+    admin.backup_to_s3()  # full
+    mygene = SmartAPI.get(MYGENE_ID)
+    mygene.slug = 'mygene-v3'
+    mygene.save()
+    refresh()
+
+    admin.backup_to_s3()  # incremental
+    _, manifest = admin._latest_manifest(s3, 'smartapi')
+    assert manifest['type'] == 'incremental'
+    assert manifest['chain'] == 1
+    delete()
+    admin.restore_from_s3()  # replayed
+    _check_restored()
+    assert SmartAPI.get(MYGENE_ID).slug == 'mygene-v3'
+
+    SmartAPI.get(MYGENE_ID).delete()
+    refresh()
+    admin.backup_to_s3()
+    _, manifest = admin._latest_manifest(s3, 'smartapi')
+    assert manifest['deleted'] == [MYGENE_ID]
+    delete()
+    admin.restore_from_s3()
+    refresh()
+    assert not SmartAPI.exists(MYGENE_ID)
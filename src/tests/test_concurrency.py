@@ -0,0 +1,92 @@
+"""
+Concurrency Limits Tests
+"""
+import asyncio
+import socket
+import time
+
+from tornado import web
+
+from utils import monitor
+from utils.concurrency import HostLimiter
+
+
+def test_host_limits():
+
+    running = {"a.com": 0, "b.com": 0}
+    peak = {"a.com": 0, "b.com": 0, "total": 0}
+
+    async def fetch(limiter, url):
+        host = limiter.host(url)
+        async with limiter(url):
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+            peak["total"] = max(peak["total"], sum(running.values()))
+            await asyncio.sleep(0.01)
+            running[host] -= 1
+
+    async def main():
+        limiter = HostLimiter(limit=3, per_host=2)
+        await asyncio.gather(*(
+            fetch(limiter, f"http://{host}/{n}.yml")
+            for host in ("a.com", "B.com") for n in range(5)
+        ))
+
+    asyncio.run(main())
+    assert peak == {"a.com": 2, "b.com": 2, "total": 3}
+
+
+class SlowHandler(web.RequestHandler):
+
+    async def get(self, *args):
+        await asyncio.sleep(float(self.get_argument("q")))
+        self.write("ok")
+
+
+def _apis(port, number, endpoints, delay):
+    return [monitor.API({
+        "_id": str(n), "info": {"title": "slow"},
+        "servers": [{"url": f"http://127.0.0.1:{port}"}],
+        "paths": {f"/{path}": {"get": {"parameters": [
+            {"name": "q", "in": "query", "example": str(delay)}
+        ]}} for path in range(endpoints)}
+    }) for n in range(number)]
+
+
+def _check(apis, limiter, timeout):
+
+    async def main():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = web.Application([(r"/.*", SlowHandler)]).listen(port)
+        _apis, _limiter = apis(port), limiter()  # shared
+        await asyncio.gather(*(
+            api.check_api_status_async(_limiter, timeout)
+            for api in _apis
+        ))
+        server.stop()
+        return [api.api_status for api in _apis]
+
+    return asyncio.run(main())
+
+
+def test_monitor_budget():
+    # the time waiting for the limiter is not
+    # spent from the budget of each endpoint.
+    statuses = _check(
+        lambda port: _apis(port, 10, 3, 0.1),
+        lambda: HostLimiter(limit=8, per_host=2),  # 1.5s in total
+        timeout=0.5)
+    assert statuses == ["good"] * 10
+
+
+def test_monitor_deadline():
+    # but an api takes at most its budget.
+    _t0 = time.perf_counter()
+    statuses = _check(
+        lambda port: _apis(port, 1, 10, 0.3),
+        lambda: HostLimiter(limit=16, per_host=1),  # 3s in total
+        timeout=1)
+    assert time.perf_counter() - _t0 < 2
+    assert statuses == ["good"]  # the responses in time
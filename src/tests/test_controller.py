@@ -1,6 +1,7 @@
 """
 SmartAPI Controller Tests
 """
+import asyncio
 import json
 import os
 import time
@@ -8,11 +9,14 @@ from datetime import datetime, timezone
 
 import elasticsearch
 import pytest
-from controller import ConflictError, ControllerError, NotFoundError, SmartAPI
+import controller
+from controller import (ConflictError, ControllerError, DocumentCache, NotFoundError,
+                        SlugRegistry, SmartAPI, digest, documents)
 from model import APIDoc
 from utils import decoder
 from utils.downloader import File
 from utils.indices import refresh, reset
+from utils.schemas import SchemaStoreError
 
 MYGENE_URL = 'https://raw.githubusercontent.com/NCATS-Tangerine/'\
     'translator-api-registry/master/mygene.info/openapi_minimum.yml'
@@ -94,6 +98,15 @@ def test_get_all_from():
     assert len(docs) == 1
 
 
+def test_iterate():
+    """
+    SmartAPI.iterate(page_size=1)
+    """
+    docs = list(SmartAPI.iterate(page_size=1))
+    assert len(docs) == 2
+    assert {doc._id for doc in docs} == {MYGENE_ID, MYCHEM_ID}
+
+
 def test_get():
     """
     smartapi = SmartAPI.get(_id)
@@ -110,6 +123,7 @@ def test_get():
     assert mygene['info']['title'] == 'MyGene.info API'
     assert mygene.raw == MYGENE_RAW
     assert mygene.url == MYGENE_URL
+    assert mygene.raw_format == 'yaml'
 
     with pytest.raises(AttributeError):
         mygene._id = "NEWID"
@@ -128,6 +142,23 @@ def test_get():
         SmartAPI.get("NOTEXIST")
 
 
+def test_get_async():
+    """
+    await SmartAPI.get_async(_id)
+    await SmartAPI.find_async(slug)
+    """
+    async def main():
+        mygene = await SmartAPI.get_async(MYGENE_ID)
+        assert mygene._id == MYGENE_ID
+        assert mygene.raw == MYGENE_RAW
+        assert await SmartAPI.find_async('mygene') == MYGENE_ID
+        assert await SmartAPI.exists_async(MYCHEM_ID)
+        with pytest.raises(NotFoundError):
+            await SmartAPI.get_async("NOTEXIST")
+
+    asyncio.run(main())
+
+
 def test_get_tags():
     """
     SmartAPI.get_tags()
@@ -156,6 +187,62 @@ def test_search():
     assert SmartAPI.find('drug', 'tags.name') == MYCHEM_ID
     assert SmartAPI.find(MYGENE_URL, 'url') == MYGENE_ID
     assert SmartAPI.find(MYCHEM_URL, 'url') == MYCHEM_ID
+    assert SmartAPI.find_many(['mygene', 'notexist', 'mychem']) == [MYGENE_ID, None, MYCHEM_ID]
+    assert SmartAPI.find_many([MYGENE_ID, 'NOTEXIST'], '_id') == [MYGENE_ID, None]
+    assert SmartAPI.find_many([]) == []
+
+
+def test_slugs():
+    """
+    SlugRegistry.load()
+    SlugRegistry.get(slug)
+    """
+    registry = SlugRegistry()
+    registry.load()
+    assert registry.get('mygene') == MYGENE_ID
+    assert registry.get('mychem') == MYCHEM_ID
+    assert registry.get('www') is None
+    assert registry.get('localhost:8000') is None
+    assert registry.get('notexist') is None
+    registry.update(MYGENE_ID, 'notexist')  # slug changed
+    assert registry.get('notexist') == MYGENE_ID
+    registry.remove(MYGENE_ID)
+    assert registry.get('notexist') is None
+
+
+def test_document_cache():
+
+    cache = DocumentCache(size=70)  # 10 bytes of raw and decoded content
+    cache.put('a', 1, b'aaaa', {'a': 1}, 'yaml')
+    cache.put('b', 1, b'bbbb', {'b': 1}, 'json')
+    assert cache.get('a', 1) == (b'aaaa', {'a': 1}, 'yaml')
+    assert cache.get('a', 2) is None  # newer version
+
+    cache.put('c', 1, b'cccc', {'c': 1}, 'json')  # evict b
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1)
+    cache.put('a', 2, b'aa', {'a': 2}, 'yaml')  # replace
+    assert cache.get('a', 1) is None
+    cache.invalidate('c')
+    assert cache.get('c', 1) is None
+    cache.put('d', 1, b'd' * 11, {}, 'json')  # too large
+    assert cache.get('d', 1) is None
+
+    assert cache.stats() == {
+        "size": 70, "used": 14, "entries": 1,
+        "hits": 2, "misses": 5, "evictions": 1
+    }
+
+    mygene = SmartAPI.get(MYGENE_ID)
+    hits = documents.hits
+    assert SmartAPI.get(MYGENE_ID).raw == mygene.raw
+    assert documents.hits == hits + 1
+    mygene.save()
+    assert documents.get(MYGENE_ID, mygene.last_updated) is None
+
+    refresh()
+    list(SmartAPI.iterate())  # not cached
+    assert documents.get(MYGENE_ID, mygene.last_updated) is None
 
 
 def test_validation():
@@ -338,6 +425,61 @@ def test_uptime_status():
     assert mygene_doc._status.uptime_status is None
 
 
+def test_bulk_save():
+    mygene = SmartAPI.get(MYGENE_ID)
+    mychem = SmartAPI.get(MYCHEM_ID)
+    mygene.uptime.update('up')
+    mychem.uptime.update('down')
+
+    saved, errors = SmartAPI.bulk_save([mygene, mychem])
+    assert (saved, errors) == (2, [])
+    refresh()
+
+    assert APIDoc.get(MYGENE_ID)._status.uptime_status == 'up'
+    assert APIDoc.get(MYCHEM_ID)._status.uptime_status == 'down'
+
+    mygene.uptime.update(None)
+    mychem.uptime.update(None)
+    SmartAPI.bulk_save([mygene, mychem])
+    refresh()
+
+
+def test_save_status():
+    mygene = SmartAPI.get(MYGENE_ID)
+    mygene.uptime.update('up')
+    mygene.save_status()
+    refresh()
+    mygene_doc = APIDoc.get(MYGENE_ID)
+    assert mygene_doc._status.uptime_status == 'up'
+    assert mygene_doc._meta.slug == mygene.slug
+
+    mygene.uptime.update(None)
+    saved, errors = SmartAPI.bulk_save_status([mygene])
+    assert (saved, errors) == (1, [])
+    refresh()
+    mygene_doc = APIDoc.get(MYGENE_ID)
+    assert mygene_doc._status.uptime_status is None
+
+    smartapi = SmartAPI("http://example.com/unsaved.yml")
+    with pytest.raises(NotFoundError):
+        smartapi.save_status()
+
+
+def test_save_status_backfill():
+    mychem = APIDoc(meta={'id': MYCHEM_ID}, **MYCHEM_ES)  # as saved before
+    mychem._raw = decoder.compress(MYCHEM_RAW)
+    mychem.save()
+    refresh()
+    assert not APIDoc.get(MYCHEM_ID)._meta.raw_hash
+
+    saved, errors = SmartAPI.bulk_save_status([SmartAPI.get(MYCHEM_ID)])
+    assert (saved, errors) == (1, [])
+    refresh()
+    mychem_doc = APIDoc.get(MYCHEM_ID)
+    assert mychem_doc._meta.raw_hash == digest(MYCHEM_RAW)
+    assert mychem_doc._meta.raw_format == 'yaml'
+
+
 def test_uptime_update():
     mygene = SmartAPI.get(MYGENE_ID)
     mygene.check()  # minimum api document
@@ -360,6 +502,15 @@ def test_uptime_update():
     assert mychem_doc._status.uptime_status == 'good'
 
 
+def test_uptime_async():
+    mygene = SmartAPI.get(MYGENE_ID)
+    assert asyncio.run(mygene.check_async()) == 'incompatible'
+
+    mychem = SmartAPI.get(MYCHEM_ID)
+    assert asyncio.run(mychem.check_async()) == 'good'
+    assert mychem.uptime.status == mychem.check()
+
+
 def test_refresh_status():
 
     with open(os.path.join(dirname, 'mygene_full.yml'), 'rb') as file:
@@ -433,6 +584,85 @@ def test_refresh_status():
     assert 'components' in mygene_doc
 
 
+def test_refresh_cache(monkeypatch):
+
+    with open(os.path.join(dirname, 'mygene_full.yml'), 'rb') as file:
+        MYGENE_FULL = file.read()
+
+    smartapi = SmartAPI("http://example.com/valid.yml")
+    smartapi.raw = MYGENE_FULL
+    smartapi.validate()
+    assert smartapi.webdoc.validation[1]
+
+    def validate(self):
+        raise AssertionError("should not revalidate.")
+
+    monkeypatch.setattr(SmartAPI, "validate", validate)
+
+    smartapi.webdoc.update(File(200, MYGENE_FULL))  # same bytes
+    assert smartapi.webdoc.status == 200
+
+
+def test_validation_offline(monkeypatch):
+
+    def load():
+        raise SchemaStoreError("offline")
+
+    monkeypatch.setattr(controller.openapis, "load", load)
+
+    smartapi = SmartAPI(SmartAPI.VALIDATION_ONLY)
+    smartapi.raw = MYGENE_RAW
+    with pytest.raises(SchemaStoreError):
+        smartapi.validate()  # not the document's fault
+
+
+def test_refresh_offline(monkeypatch):
+
+    with open(os.path.join(dirname, 'mygene_full.yml'), 'rb') as file:
+        MYGENE_FULL = file.read()
+
+    smartapi = SmartAPI("http://example.com/valid.yml")
+    smartapi.raw = MYGENE_FULL
+    smartapi.webdoc.update(File(304))
+    assert smartapi.webdoc.status == 200
+    validation = smartapi.webdoc.validation
+
+    def load():
+        raise SchemaStoreError("offline")
+
+    monkeypatch.setattr(controller, "fingerprint", load)
+    monkeypatch.setattr(controller.openapis, "load", load)
+
+    smartapi.webdoc.update(File(200, MYGENE_RAW))  # changed
+    assert smartapi.webdoc.status == 200  # not a validation result
+    assert smartapi.webdoc.validation == validation
+    assert smartapi.raw == MYGENE_FULL
+
+
+def test_refresh_conditional():
+
+    with open(os.path.join(dirname, 'mygene_full.yml'), 'rb') as file:
+        MYGENE_FULL = file.read()
+
+    smartapi = SmartAPI("http://example.com/valid.yml")
+    smartapi.raw = MYGENE_FULL
+    assert smartapi.webdoc.conditions == {'etag': None, 'last_modified': None}
+
+    last_modified = 'Wed, 21 Oct 2020 07:28:00 GMT'
+    smartapi.webdoc.update(File(200, MYGENE_FULL, 'abc', None, last_modified))
+    assert smartapi.webdoc.status == 200
+    assert smartapi.webdoc.conditions == {'etag': 'abc', 'last_modified': last_modified}
+
+    smartapi.webdoc.update(File(304))  # not modified
+    assert smartapi.webdoc.status == 200
+    assert smartapi.raw == MYGENE_FULL
+    assert smartapi.webdoc.conditions['etag'] == 'abc'
+
+    smartapi.webdoc.update(File(200, b'{"openapi":"3.0.0"}', 'def'))  # invalid
+    assert smartapi.webdoc.status == 499
+    assert smartapi.webdoc.conditions['etag'] == 'abc'
+
+
 def test_refresh_update():
 
     mychem = SmartAPI.get(MYCHEM_ID)
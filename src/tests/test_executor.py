@@ -0,0 +1,36 @@
+"""
+Bounded Process Pool Tests
+"""
+import asyncio
+import time
+
+import pytest
+from utils.executor import BoundedExecutor, QueueFull
+
+
+def wait(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_inline():
+    executor = BoundedExecutor()
+    assert asyncio.run(executor.submit(wait, 0)) == 0
+
+
+def test_queue_full():
+
+    async def main():
+        executor = BoundedExecutor(workers=1, queue=1)
+        tasks = [
+            asyncio.ensure_future(executor.submit(wait, 0.5)),
+            asyncio.ensure_future(executor.submit(wait, 0.5))
+        ]
+        await asyncio.sleep(0)  # start both
+        with pytest.raises(QueueFull):
+            await executor.submit(wait, 0)
+        assert await asyncio.gather(*tasks) == [0.5, 0.5]
+        assert await executor.submit(wait, 0) == 0
+        executor.shutdown()
+
+    asyncio.run(main())
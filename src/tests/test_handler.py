@@ -161,6 +161,31 @@ class TestValidate(SmartAPIEndpoint):
         with open(os.path.join(dirname, './validate/x-translator-fail-2.yml'), 'rb') as file:
             self.request("/api/validate/", method='POST', data=file.read(), expect=400)
 
+    def test_batch(self):
+        '''
+        [POST] with NDJSON body
+        '''
+        docs = []
+        for name in (
+            'openapi-pass.json', 'swagger-pass.json',
+            'x-translator-pass.json', 'x-translator-fail-1.yml'
+        ):
+            with open(os.path.join(dirname, 'validate', name), 'rb') as file:
+                docs.append(json.dumps(decoder.to_dict(file.read())))
+        headers = {'Content-type': 'application/x-ndjson'}
+        res = self.request("/api/validate/", method='POST', data='\n'.join(docs), headers=headers)
+        results = {item['index']: item['success'] for item in map(json.loads, res.text.splitlines())}
+        assert results == {0: True, 1: True, 2: True, 3: False}
+
+    def test_batch_urls(self):
+        '''
+        [POST] with a JSON array of URLs
+        '''
+        res = self.request("/api/validate/", method='POST', json=["notaurl", "ftp://x/y"])
+        results = [json.loads(line) for line in res.text.splitlines()]
+        assert len(results) == 2
+        assert not any(result['success'] for result in results)
+
 
 class TestSuggestion(SmartAPIEndpoint):
 
@@ -219,6 +244,58 @@ class TestCRUD(SmartAPIEndpoint):
         res = self.request("/api/metadata/" + MYGENE_ID + "?format=yaml")
         yaml.load(res.text, Loader=yaml.SafeLoader)
 
+    def test_get_cached(self):
+
+        res = self.request("/api/metadata/" + MYGENE_ID)
+        etag, last_modified = res.headers['ETag'], res.headers['Last-Modified']
+        self.request("/api/metadata/" + MYGENE_ID, headers={'If-None-Match': etag}, expect=304)
+        self.request("/api/metadata/" + MYGENE_ID, headers={'If-Modified-Since': last_modified}, expect=304)
+        self.request("/api/metadata/" + MYGENE_ID, headers={'If-None-Match': '"outdated"'})
+        self.request("/api/metadata/" + MYGENE_ID + "?format=yaml", headers={'If-None-Match': etag})
+
+        res = self.request("/api/metadata/")
+        self.request("/api/metadata/", headers={'If-None-Match': res.headers['ETag']}, expect=304)
+        assert 'Last-Modified' not in res.headers  # lists
+        self.request("/api/metadata/", headers={'If-Modified-Since': last_modified})
+
+    def test_get_serialized(self):
+
+        res = self.request("/api/metadata/" + MYGENE_ID)
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert res.json()['info']['title'] == 'MyGene.info API'
+
+        _res = self.request("/api/metadata/" + MYGENE_ID, headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in _res.headers
+        assert _res.content == res.content  # cached
+        assert _res.headers['ETag'] != res.headers['ETag']
+
+        res = self.request("/api/metadata/" + MYGENE_ID + "?format=yaml")
+        assert res.headers['Content-Type'].startswith('text/x-yaml')
+        assert yaml.load(res.text, Loader=yaml.SafeLoader) == _res.json()
+
+    def test_get_raw(self):
+
+        res = self.request("/api/metadata/" + MYGENE_ID + "?format=raw")
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert res.headers['Content-Type'].startswith('text/yaml')
+        assert res.content == MYGENE_RAW
+
+        res = self.request(
+            "/api/metadata/" + MYGENE_ID + "?format=raw",
+            headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in res.headers
+        assert res.content == MYGENE_RAW
+
+        self.request(
+            "/api/metadata/" + MYGENE_ID + "?format=raw",
+            headers={'If-None-Match': res.headers['ETag'], 'Accept-Encoding': 'identity'},
+            expect=304)
+        _res = self.request(  # gzip, a different representation
+            "/api/metadata/" + MYGENE_ID + "?format=raw",
+            headers={'If-None-Match': res.headers['ETag']})
+        assert _res.headers['ETag'] != res.headers['ETag']
+        self.request("/api/metadata/NOTEXIST?format=raw", expect=404)
+
     def test_get_all(self):
 
         res = self.request("/api/metadata/", method='GET').json()
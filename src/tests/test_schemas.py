@@ -0,0 +1,38 @@
+"""
+SmartAPI Schema Store Tests
+"""
+import json
+
+import pytest
+from utils.schemas import SchemaStore, SchemaStoreError, checksum
+
+URL = "http://nohost/schema.json"
+RAW = b'{"type": "object"}'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    (tmp_path / "schema").write_bytes(RAW)
+    (tmp_path / "schema.json").write_text(json.dumps({
+        "url": URL, "hash": checksum(RAW),
+        "content_type": "application/json"
+    }))
+    return str(tmp_path)
+
+
+def test_cached(cache, monkeypatch):
+    store = SchemaStore({"schema": URL}, path=cache)
+    monkeypatch.setattr(store, "refresh", lambda names: None)
+    assert store["schema"] == {"type": "object"}
+    assert list(store) == ["schema"]
+
+
+def test_pinned(cache, monkeypatch):
+    store = SchemaStore({"schema": URL}, {"schema": "0000"}, path=cache)
+
+    def download(name, meta=None):
+        raise SchemaStoreError("offline")
+
+    monkeypatch.setattr(store, "_download", download)
+    with pytest.raises(SchemaStoreError):
+        store.load()  # cached copy is not the pinned one
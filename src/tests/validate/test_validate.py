@@ -2,7 +2,7 @@ import os
 
 import pytest
 
-from controller import openapis, swaggers, validate
+from controller import openapis, swaggers, validate, validators
 
 dirname = os.path.dirname(__file__)
 
@@ -22,6 +22,19 @@ with open(os.path.join(dirname, 'x-translator-fail-2.yml'), 'rb') as file:
     FAIL_TRANSLATOR_2 = file.read()
 
 
+@pytest.fixture(autouse=True, params=validators.ENGINES)
+def engine(request):
+    """
+    Expect the same results under every engine.
+    """
+    if request.param == 'fastjsonschema':
+        pytest.importorskip('fastjsonschema')
+    _engine = validators.engine
+    validators.engine = request.param
+    yield request.param
+    validators.engine = _engine
+
+
 def test_01():
     validate(PASS_OPENAPI, {"openapi": openapis["openapi_v3"]})
     validate(PASS_OPENAPI, openapis)
@@ -51,3 +64,13 @@ def test_05():
         validate(PASS_SWAGGER, openapis)
     with pytest.raises(ValueError):
         validate(PASS_OPENAPI, swaggers)
+
+
+def test_06():
+    validate(PASS_OPENAPI, openapis)
+    validator = validators["openapi_v3"]
+    validate(PASS_TRANSLATOR, openapis)
+    assert validators["openapi_v3"] is validator
+    with pytest.raises(ValueError):
+        validate(PASS_OPENAPI, {"openapi_v3": swaggers["swagger_v2"]})
+    assert validators["openapi_v3"] is not validator
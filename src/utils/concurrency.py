@@ -0,0 +1,41 @@
+"""
+    Concurrency Limits
+
+    Bound the number of concurrent network operations,
+    in total and for each host, so that a job working
+    through many urls does not overwhelm the one server,
+    like raw.githubusercontent.com, hosting most of them.
+
+        limiter = HostLimiter(limit=16, per_host=4)
+        async with limiter(url):
+            file = await download_async(url)
+
+    Create within the event loop that uses it.
+"""
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+
+class HostLimiter():
+
+    def __init__(self, limit=16, per_host=4):
+
+        self.limit = limit
+        self.per_host = per_host
+
+        self._total = asyncio.Semaphore(limit)
+        self._hosts = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    @staticmethod
+    def host(url):
+        return urlparse(url).netloc.lower()
+
+    @asynccontextmanager
+    async def __call__(self, url):
+        # wait for the host first, not to hold
+        # a slot other hosts could have used.
+        async with self._hosts[self.host(url)]:
+            async with self._total:
+                yield
@@ -1,10 +1,41 @@
-""" Stream Decoder """
+"""
+    Stream Decoder
+
+    Compression:
+        gzip, the default, or
+        zstd, optionally with a trained dictionary.
+
+    Compressed streams are identified by their magic
+    numbers, so documents compressed either way, and
+    with any dictionary, can be decompressed.
+
+    Dictionaries are stored as <dict_id>.dict files in
+    ZSTD_DICT_PATH. They are needed as long as any stream
+    compressed with them is, keep them with the code.
+"""
 
 import gzip
 import json
+import os
+import zlib
 
 import yaml
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# libyaml bindings, if available, same safe constructors
+YAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# parse environment variables
+COMPRESSION = os.getenv('COMPRESSION', 'gzip')
+ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', '12'))
+ZSTD_DICT_ID = os.getenv('ZSTD_DICT_ID')  # compress with
+ZSTD_DICT_PATH = os.getenv('ZSTD_DICT_PATH', os.path.join(
+    os.path.dirname(__file__), 'dicts'))
+
 # -------------
 #  Conversion
 # -------------
@@ -14,7 +45,7 @@ TYPE_ERR = "Expect a serialization of a mapping type."
 
 def to_yaml(stream):
     try:
-        data = yaml.load(stream, Loader=yaml.SafeLoader)
+        data = yaml.load(stream, Loader=YAMLLoader)
     except (
         yaml.scanner.ScannerError,
         yaml.parser.ParserError
@@ -35,6 +66,29 @@ def to_json(stream):
     return data
 
 
+def _sniff(stream):
+
+    # javascript files
+    if isinstance(stream, bytes):
+        try:
+            stream = stream.decode()
+        except UnicodeDecodeError:
+            pass
+    if isinstance(stream, str):
+        if stream.startswith("export default "):
+            stream = stream[len("export default "):]
+
+    # json is a subset of yaml, but much faster to parse
+    if stream.lstrip()[:1] in ('{', b'{'):
+        try:
+            return to_json(stream), 'json'
+        except ValueError:
+            pass  # like yaml flow style
+
+    # brute force
+    return to_yaml(stream), 'yaml'
+
+
 def to_dict(stream, ext=None, ctype=None):
     """
     Load a string or bytes to a dict.
@@ -57,27 +111,132 @@ def to_dict(stream, ext=None, ctype=None):
     if 'yaml' in ctype:
         return to_yaml(stream)
 
-    # javascript files
-    if isinstance(stream, bytes):
+    return _sniff(stream)[0]
+
+
+def load(stream, fmt=None):
+    """
+    Load a string or bytes to a dict, and detect
+    its format, 'json' or 'yaml'. Return both.
+    If the format is known, like from a previous
+    load, try it first, skipping the detection,
+    unless yaml content now looks like json, as
+    yaml would load it too.
+    """
+    if fmt == 'yaml' and stream.lstrip()[:1] in ('{', b'{'):
+        fmt = None  # may have changed to json
+
+    if fmt in ('json', 'yaml'):
         try:
-            stream = stream.decode()
-        except UnicodeDecodeError:
-            pass
-    if isinstance(stream, str):
-        if stream.startswith("export default "):
-            stream = stream[len("export default "):]
+            return to_dict(stream, fmt), fmt
+        except (ValueError, TypeError):
+            pass  # content changed
 
-    # brute force
-    return to_yaml(stream)
+    return _sniff(stream)
 
 
 # -------------
 # Compression
 # -------------
 
-def compress(stream):
-    return gzip.compress(stream) if stream else None
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_dicts = {}  # dict_id: ZstdCompressionDict
+
+
+def _zstandard():
+    if not zstandard:
+        raise RuntimeError("Requires zstandard.")
+    return zstandard
+
+
+def dictionary(dict_id):
+    """
+    Load a trained zstd dictionary by its id.
+    """
+    dict_id = int(dict_id)
+    if dict_id not in _dicts:
+        path = os.path.join(ZSTD_DICT_PATH, f'{dict_id}.dict')
+        with open(path, 'rb') as file:
+            data = _zstandard().ZstdCompressionDict(file.read())
+        data.precompute_compress(level=ZSTD_LEVEL)
+        _dicts[dict_id] = data
+    return _dicts[dict_id]
+
+
+def train_dictionary(samples, size=112640):
+    """
+    Train a zstd dictionary of at most size bytes,
+    on samples, a list of bytes, and save it to
+    ZSTD_DICT_PATH. Return its dict_id.
+    """
+    data = _zstandard().train_dictionary(size, samples)
+    os.makedirs(ZSTD_DICT_PATH, exist_ok=True)
+    path = os.path.join(ZSTD_DICT_PATH, f'{data.dict_id()}.dict')
+    with open(path, 'wb') as file:
+        file.write(data.as_bytes())
+    return data.dict_id()
+
+
+def compress(stream, method=None, dict_id=None):
+    """
+    Compress bytes with gzip or zstd, by default
+    the configured COMPRESSION and ZSTD_DICT_ID.
+    """
+    if not stream:
+        return None
+
+    method = method or COMPRESSION
+    if method == 'gzip':
+        return gzip.compress(stream)
+    if method == 'zstd':
+        dict_id = dict_id or ZSTD_DICT_ID
+        compressor = _zstandard().ZstdCompressor(
+            level=ZSTD_LEVEL,
+            dict_data=dictionary(dict_id) if dict_id else None)
+        return compressor.compress(stream)
+
+    raise ValueError(f"Unsupported compression {method}.")
 
 
 def decompress(stream):
-    return gzip.decompress(stream) if stream else None
+    """
+    Decompress bytes compressed by either method.
+    """
+    if not stream:
+        return None
+
+    if stream.startswith(ZSTD_MAGIC):
+        dict_id = _zstandard().get_frame_parameters(stream).dict_id
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=dictionary(dict_id) if dict_id else None)
+        return decompressor.decompress(stream)
+
+    return gzip.decompress(stream)
+
+
+def iter_decompress(stream, chunk_size=16384):
+    """
+    Decompress bytes compressed by either method,
+    chunk_size bytes of input at a time, yielding
+    the output as it becomes available.
+    """
+    if not stream:
+        return
+
+    if stream.startswith(ZSTD_MAGIC):
+        dict_id = _zstandard().get_frame_parameters(stream).dict_id
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=dictionary(dict_id) if dict_id else None
+        ).decompressobj()
+    else:  # gzip header and trailer
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    for start in range(0, len(stream), chunk_size):
+        chunk = decompressor.decompress(stream[start: start + chunk_size])
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
@@ -24,15 +24,8 @@ File = namedtuple("File", (
     "raw",  # response body as bytes
     "etag",  # stripped ETag hash in header
     "date",  # response time in header
-))
-
-# PYTHON 3.7 - MARK A
-# File = namedtuple("File", (
-#     "status",  # HTTP status code
-#     "raw",  # response body as bytes
-#     "etag",  # stripped ETag hash in header
-#     "date",  # response time in header
-# ), defaults=repeat(None, 4))
+    "last_modified",  # Last-Modified header as is
+), defaults=repeat(None, 5))
 
 # NOTE may also be helpful to record
 # response expiration time in header
@@ -70,6 +63,9 @@ class ResponseParser(ABC):
         etag = self._response.headers.get("ETag", "")
         return etag.strip('W/"') or None
 
+    def get_last_modified(self):
+        return self._response.headers.get("Last-Modified")
+
     def get_date(self):
         # https://docs.python.org/3/library/email.utils.html#email.utils.parsedate_to_datetime
 
@@ -118,9 +114,25 @@ class TornadoParser(ResponseParser):
 # TODO REQUIRE ADDITIONAL TESTING TO UNDERSTAND ERROR TYPES
 
 
-def download(url, timeout=5, raise_error=True):
+def conditional_headers(etag=None, last_modified=None):
+    """
+    Request headers to download only if the file changed
+    since the one with the etag or last modified time.
+    A not modified response has 304 status and no content.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = f'"{etag}"'
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def download(url, timeout=5, raise_error=True, etag=None, last_modified=None):
     try:
-        response = requests.get(url, timeout=timeout)
+        response = requests.get(
+            url, timeout=timeout,
+            headers=conditional_headers(etag, last_modified))
         if raise_error:
             response.raise_for_status()
         result = RequestsParser(response)
@@ -129,36 +141,43 @@ def download(url, timeout=5, raise_error=True):
     except requests.exceptions.RequestException as err:
         if raise_error:
             raise DownloadError(str(err)) from err
-        return File(599, None, None, None)  # MARK A
+        return File(599)
     else:
         return File(
             status=result.get_status(),
             raw=result.get_raw(),
             etag=result.get_etag(),
-            date=result.get_date()
+            date=result.get_date(),
+            last_modified=result.get_last_modified()
         )
 
 
-async def download_async(url, timeout=20, raise_error=True):
+async def download_async(url, timeout=20, raise_error=True, etag=None, last_modified=None):
     client = httpclient.AsyncHTTPClient()
     try:
         response = await client.fetch(
             url, request_timeout=timeout,
             raise_error=raise_error,
+            headers=conditional_headers(etag, last_modified),
             ca_certs=certifi.where())
         result = TornadoParser(response)
     except httpclient.HTTPClientError as err:
+        if err.code == 304:  # not an error
+            return File(304, etag=etag, last_modified=last_modified)
+        if not raise_error:  # timeout
+            return File(err.code)
         raise DownloadError(str(err)) from err
     except IOError as err:
         if raise_error:
             raise DownloadError(type(err).__name__) from err
-        return File(599, None, None, None)  # MARK A
+        return File(599)
     else:
         return File(
             status=result.get_status(),
             raw=result.get_raw(),
             etag=result.get_etag(),
-            date=result.get_date()
+            date=result.get_date(),
+            last_modified=result.get_last_modified()
         )
 
 
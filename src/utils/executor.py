@@ -0,0 +1,64 @@
+"""
+    Bounded Process Pool
+
+    Run CPU-bound functions, like document decoding
+    and validation, in worker processes so that the
+    event loop stays responsive. Reject new work when
+    the pool and its queue are full.
+
+        executor = BoundedExecutor(workers=4, queue=16)
+        result = await executor.submit(func, *args)
+
+    With zero workers, functions run in the calling
+    process, blocking, as if called directly.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from tornado.ioloop import IOLoop
+
+
+class QueueFull(Exception):
+    """Too many pending tasks"""
+
+
+class BoundedExecutor():
+
+    def __init__(self, workers=0, queue=0):
+
+        self.workers = workers
+        self.queue = queue
+        self.pending = 0
+
+        self._pool = None
+        if workers > 0:
+            self._pool = ProcessPoolExecutor(workers)
+
+    @property
+    def capacity(self):
+        """
+        The maximum number of pending tasks,
+        running or waiting for a worker.
+        """
+        return self.workers + self.queue
+
+    async def submit(self, func, *args):
+        """
+        Run func(*args) in a worker process and return the result.
+        Raise QueueFull immediately if at capacity.
+        Functions and arguments must be picklable.
+        """
+        if not self._pool:
+            return func(*args)
+
+        if self.pending >= self.capacity:
+            raise QueueFull()
+
+        self.pending += 1
+        try:
+            return await IOLoop.current().run_in_executor(self._pool, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self, wait=True):
+        if self._pool:
+            self._pool.shutdown(wait)
@@ -46,3 +46,12 @@ def refresh():
 
     index = Index(APIDoc.Index.name)
     index.refresh()
+
+
+def refresh_interval(value):
+    """
+    Set the refresh interval of the index,
+    "-1" to disable, None for the default.
+    """
+    index = Index(APIDoc.Index.name)
+    index.put_settings(body={"index": {"refresh_interval": value}})
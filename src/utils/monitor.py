@@ -7,15 +7,24 @@
         Incompatible,
         Unknown
 
+    Probe the endpoints with examples, one by one,
+    or concurrently with check_api_status_async.
+
 """
 
+import asyncio
+import json
 import logging
+from urllib.parse import urlencode
 
 import requests
+from tornado import httpclient
 
 # pylint:disable=import-error, ungrouped-imports
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
+from utils.concurrency import HostLimiter
+
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # pylint:disable=no-member
 
 
@@ -65,14 +74,11 @@ class API:
         self.components = api_doc.get('components')
         self.endpoints_info = api_doc.get('paths')
 
-    def check_api_status(self):
+    def endpoints(self):
         '''
-            loop through each endpoint and extract parameter & example $ HTTP method information
+            extract parameter & example & HTTP method information
+            of each endpoint with parameters, in path order
         '''
-
-        if not self.api_server:
-            return
-
         for _endpoint, _endpoint_info in self.endpoints_info.items():
             endpoint_doc = {'name': '/'.join(s.strip('/') for s in (self.api_server, _endpoint)),
                             'components': self.components}
@@ -84,19 +90,81 @@ class API:
                 endpoint_doc['params'] = _endpoint_info.get('post').get('parameters')
                 endpoint_doc['requestbody'] = _endpoint_info['post'].get('requestBody')
             if endpoint_doc.get('params'):
-                endpoint = Endpoint(endpoint_doc)
-                try:
-                    response = endpoint.make_api_call()
-                except Exception as exception:  # pylint: disable=broad-except
-                    logger = logging.getLogger("utils.monitor")
-                    logger.error(exception)
-                else:
-                    if response:
-                        status = endpoint.check_response_status(response)
-                        if status == 200:
-                            self.api_status = 'good'
-                        else:
-                            self.api_status = 'bad'
+                yield Endpoint(endpoint_doc)
+
+    def update_api_status(self, endpoint, response):
+        '''
+            the last endpoint with a successful response decides
+        '''
+        if response is not None and endpoint.check_response_status(response) < 400:
+            if endpoint.check_response_status(response) == 200:
+                self.api_status = 'good'
+            else:
+                self.api_status = 'bad'
+
+    def check_api_status(self):
+        '''
+            loop through each endpoint and make an api call
+        '''
+
+        if not self.api_server:
+            return
+
+        for endpoint in self.endpoints():
+            try:
+                response = endpoint.make_api_call()
+            except Exception as exception:  # pylint: disable=broad-except
+                logger = logging.getLogger("utils.monitor")
+                logger.error(exception)
+            else:
+                self.update_api_status(endpoint, response)
+
+    async def check_api_status_async(self, limiter=None, timeout=60):
+        '''
+            make the api calls of all endpoints concurrently,
+            within timeout seconds, counted from when the first
+            call gets a slot from the limiter, each endpoint also
+            within timeout seconds of its own time in a slot,
+            and apply the responses in path order, as if
+            checked one by one.
+            endpoints not responding in time are skipped.
+        '''
+
+        if not self.api_server:
+            return
+
+        limiter = limiter or HostLimiter()
+        endpoints = list(self.endpoints())
+        if not endpoints:
+            return
+
+        started = asyncio.Event()  # the first call has a slot
+        tasks = [
+            asyncio.ensure_future(endpoint.make_api_call_async(limiter, timeout, started))
+            for endpoint in endpoints
+        ]
+        waiter = asyncio.ensure_future(started.wait())
+        await asyncio.wait(tasks + [waiter], return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()  # if all failed before a slot
+
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        logger = logging.getLogger("utils.monitor")
+        timeouts = len(pending) + sum(
+            isinstance(task.exception(), asyncio.TimeoutError)
+            for task in tasks if task not in pending)
+        if timeouts:
+            logger.warning("%s: %s endpoints timed out.", self.id, timeouts)
+
+        for endpoint, task in zip(endpoints, tasks):
+            if task in pending or isinstance(task.exception(), asyncio.TimeoutError):
+                continue
+            if task.exception():
+                logger.error(task.exception())
+            else:
+                self.update_api_status(endpoint, task.result())
 
     def __str__(self):
         return f"{self.id}: {self.api_status} ({self.name})"
@@ -107,6 +175,11 @@ class Endpoint:
         An API Endpoint
     '''
 
+    HEADERS = {
+        'User-Agent': 'SmartAPI API status monitor'
+    }
+    TIMEOUT = 10
+
     def __init__(self, endpoint_doc):
         self.endpoint_name = endpoint_doc['name']
         self.method = endpoint_doc['method']
@@ -114,10 +187,12 @@ class Endpoint:
         self.requestbody = endpoint_doc.get('requestbody')
         self.components = endpoint_doc.get('components')
 
-    def make_api_call(self):
-        headers = {
-            'User-Agent': 'SmartAPI API status monitor'
-        }
+    def attempts(self):
+        '''
+            generate the api calls to try in order, until one gets
+            a response, as (method, url, kwargs), where kwargs has
+            one of params, data or json like in requests.request
+        '''
         url = self.endpoint_name
         logger = logging.getLogger("utils.uptime.endpoint.make_api_call")
         # handle API endpoint which use GET HTTP method
@@ -135,26 +210,11 @@ class Endpoint:
                     # parameter in query
                     elif _param['in'] == 'query':
                         params = {_param['name']: _param['example']}
-                    try:
-                        response = requests.get(url,
-                                                params=params,
-                                                verify=False,
-                                                timeout=10,
-                                                headers=headers)
-                        return response
-                    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                        pass
+                    yield 'GET', url, {'params': params}
                 elif 'required' in _param and _param['required'] is True:
                     example = True
             if not example:
-                try:
-                    response = requests.get(url,
-                                            timeout=10,
-                                            verify=False,
-                                            headers=headers)
-                    return response
-                except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                    pass
+                yield 'GET', url, {}
         # handle API endpoint which use POST HTTP method
         elif self.method == "POST":
             data = {}
@@ -165,15 +225,7 @@ class Endpoint:
                         url = url.replace('{' + _param['name'] + '}', _param['example'])
                     elif _param['in'] == 'query':
                         data = {_param['name']: _param['example']}
-                    try:
-                        response = requests.post(url,
-                                                 data=data,
-                                                 timeout=10,
-                                                 verify=False,
-                                                 headers=headers)
-                        return response
-                    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                        pass
+                    yield 'POST', url, {'data': data}
                 elif 'required' in _param and _param['required'] is True:
                     example = True
             if self.requestbody:
@@ -185,15 +237,7 @@ class Endpoint:
                         ref = schema.get('$ref')
                         if example:
                             logger.debug(url)
-                            try:
-                                response = requests.post(url,
-                                                         timeout=10,
-                                                         json=example,
-                                                         verify=False,
-                                                         headers=headers)
-                                return response
-                            except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                                pass
+                            yield 'POST', url, {'json': example}
                         elif ref:
                             logger.debug(url)
                             if ref.startswith('#/components/'):
@@ -203,26 +247,77 @@ class Endpoint:
                                 example = DictQuery(self.components).get(component_path)
                                 logger.debug('example %s', example)
                                 if example:
-                                    try:
-                                        response = requests.post(url,
-                                                                 timeout=10,
-                                                                 json=example,
-                                                                 verify=False,
-                                                                 headers=headers)
-                                        logger.debug(response)
-                                        return response
-                                    except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                                        pass
+                                    yield 'POST', url, {'json': example}
 
             if not example:
-                try:
-                    response = requests.post(url,
-                                             timeout=10,
-                                             verify=False,
-                                             headers=headers)
-                    return response
-                except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
-                    pass
+                yield 'POST', url, {}
+
+    def make_api_call(self):
+        for method, url, kwargs in self.attempts():
+            try:
+                response = requests.request(method, url,
+                                            timeout=self.TIMEOUT,
+                                            verify=False,
+                                            headers=self.HEADERS,
+                                            **kwargs)
+                return response
+            except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+                pass
+        return None
+
+    async def make_api_call_async(self, limiter, timeout=None, started=None):
+        '''
+            like make_api_call, through the limiter, raise
+            asyncio.TimeoutError if the attempts take more
+            than timeout seconds, not counting the time
+            spent waiting for the limiter. set the started
+            event once holding a slot.
+        '''
+        client = httpclient.AsyncHTTPClient()
+        loop = asyncio.get_event_loop()
+        remaining = timeout
+        for method, url, kwargs in self.attempts():
+            request = self._tornado_request(method, url, kwargs)
+            try:
+                async with limiter(url):
+                    if started:
+                        started.set()
+                    _t0 = loop.time()
+                    try:
+                        response = await asyncio.wait_for(
+                            client.fetch(request, raise_error=False), remaining)
+                    finally:
+                        if remaining is not None:
+                            remaining -= loop.time() - _t0
+            except asyncio.TimeoutError:
+                raise  # an OSError since python 3.11
+            except (httpclient.HTTPClientError, OSError):
+                continue  # timeout or connection error
+            if response.code == 599:
+                continue  # same, reported as a response
+            return response
+        return None
+
+    def _tornado_request(self, method, url, kwargs):
+        headers = dict(self.HEADERS)
+        body = None
+        if kwargs.get('params'):
+            url += ('&' if '?' in url else '?') + urlencode(kwargs['params'])
+        if method == 'POST':
+            body = ''  # required
+            if kwargs.get('data'):
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                body = urlencode(kwargs['data'])
+            elif 'json' in kwargs:
+                headers['Content-Type'] = 'application/json'
+                body = json.dumps(kwargs['json'])
+        return httpclient.HTTPRequest(
+            url, method=method, headers=headers, body=body,
+            connect_timeout=self.TIMEOUT,
+            request_timeout=self.TIMEOUT,
+            validate_cert=False)
 
     def check_response_status(self, response):
+        if isinstance(response, httpclient.HTTPResponse):
+            return response.code
         return response.status_code
@@ -0,0 +1,75 @@
+"""
+    S3 Multipart Upload
+
+    Writable file-like object uploading to S3 in parts,
+    so that large files can be written incrementally
+    without holding them in memory.
+
+        s3 = boto3.client('s3')
+        with MultipartUpload(s3, 'bucket', 'key') as file:
+            file.write(b'...')
+
+    The upload is completed on close and aborted if
+    an exception is raised within the with block.
+"""
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # except the last part
+
+
+class MultipartUpload():
+
+    def __init__(self, client, bucket, key, part_size=8 * 1024 * 1024, **kwargs):
+
+        assert part_size >= MIN_PART_SIZE
+
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.size = 0  # bytes written
+
+        self._parts = []
+        self._buffer = bytearray()
+        self._upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=key, **kwargs)['UploadId']
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def flush(self):
+        pass  # parts have a minimum size
+
+    def _upload_part(self):
+        number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key,
+            UploadId=self._upload_id, PartNumber=number,
+            Body=bytes(self._buffer))
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self._buffer.clear()
+
+    def close(self):
+        if self._buffer or not self._parts:
+            self._upload_part()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key,
+            UploadId=self._upload_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
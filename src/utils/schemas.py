@@ -0,0 +1,223 @@
+"""
+    Schema Store
+
+    Remote mapping files, like the OpenAPI JSON schemas,
+    cached on local disk and loaded on first access.
+
+    Cache layout, for each schema name:
+        <name>       downloaded bytes
+        <name>.json  url, hash, etag, last-modified, content-type
+
+    A cached file is used only if its hash matches the one
+    recorded when it was downloaded, and the pinned hash in
+    schemas.ini, if provided. After loading from the cache,
+    the files are refreshed in the background with
+    conditional requests.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Mapping
+from threading import Lock, Thread
+
+import requests
+
+from utils import decoder
+from utils.downloader import file_extension
+
+if sys.version_info.major >= 3 and sys.version_info.minor >= 6:
+    from hashlib import blake2b
+else:
+    from pyblake2 import blake2b  # pylint: disable=import-error
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE = os.getenv('SCHEMA_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'smartapi', 'schemas'))
+
+
+class SchemaStoreError(Exception):
+    """Error loading a schema"""
+
+
+def checksum(stream):
+    return blake2b(stream).hexdigest()
+
+
+class SchemaStore(Mapping):
+    """
+        Container for remote mapping files.
+        Support read-only dictionary-like access.
+    """
+
+    def __init__(self, urls, pins=None, path=SCHEMA_CACHE, timeout=20):
+
+        self.urls = dict(urls)  # name: url
+        self.pins = dict(pins or {})  # name: hash
+        self.path = path
+        self.timeout = timeout
+
+        self._data = None
+        self._lock = Lock()
+
+    # -------------
+    #  Local Disk
+    # -------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read(self, name):
+        try:
+            with open(self._file(name) + '.json', 'r') as file:
+                meta = json.load(file)
+            with open(self._file(name), 'rb') as file:
+                raw = file.read()
+        except (OSError, ValueError):
+            return None, None
+
+        if meta.get('url') != self.urls[name]:
+            return None, None  # source changed
+        if meta.get('hash') != checksum(raw):
+            logger.warning("Corrupted schema cache %s.", name)
+            return None, None
+        if self.pins.get(name, meta['hash']) != meta['hash']:
+            logger.warning("Unpinned schema cache %s.", name)
+            return None, None
+
+        return raw, meta
+
+    def _write(self, name, raw, meta):
+        os.makedirs(self.path, exist_ok=True)
+        for filename, content, mode in (
+            (self._file(name), raw, 'wb'),
+            (self._file(name) + '.json', json.dumps(meta), 'w')
+        ):  # replace atomically
+            with open(filename + '.tmp', mode) as file:
+                file.write(content)
+            os.replace(filename + '.tmp', filename)
+
+    # -------------
+    #   Network
+    # -------------
+
+    def _download(self, name, meta=None):
+        """
+        Download a schema, conditionally if meta is provided.
+        Return the raw bytes and the meta, or (None, meta) if
+        the file has not been modified since.
+        """
+        url = self.urls[name]
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as err:
+            raise SchemaStoreError(f"{name}: {err}") from err
+
+        if response.status_code == 304:
+            return None, meta
+
+        raw = response.content
+        _hash = checksum(raw)
+        if self.pins.get(name, _hash) != _hash:
+            raise SchemaStoreError(f"{name}: hash mismatch.")
+
+        meta = {
+            "url": url,
+            "hash": _hash,
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+            "content_type": response.headers.get('Content-Type')
+        }
+        return raw, meta
+
+    def _parse(self, name, raw, meta):
+        try:
+            return decoder.to_dict(
+                stream=raw,
+                ext=file_extension(self.urls[name]),
+                ctype=meta.get('content_type')
+            )
+        except (ValueError, TypeError) as err:
+            raise SchemaStoreError(f"{name}: {err}") from err
+
+    # -------------
+    #  Operations
+    # -------------
+
+    def load(self):
+        """
+        Load all schemas, from the local disk if cached.
+        Download and cache the ones that are not.
+        """
+        with self._lock:
+
+            if self._data is not None:
+                return  # already loaded
+
+            _t0 = time.perf_counter()
+            data, cached = {}, []
+            for name in self.urls:
+                raw, meta = self._read(name)
+                if raw:
+                    cached.append(name)
+                    data[name] = self._parse(name, raw, meta)
+                else:  # blocking network operation
+                    raw, meta = self._download(name)
+                    data[name] = self._parse(name, raw, meta)
+                    self._write(name, raw, meta)
+            self._data = data
+
+            logger.info(
+                "Loaded %s schemas in %.3fs, %s from cache.",
+                len(data), time.perf_counter() - _t0, len(cached))
+
+        if cached:  # check for new versions
+            Thread(target=self.refresh, args=(cached,), daemon=True).start()
+
+    def refresh(self, names=None):
+        """
+        Download schemas that have changed since cached.
+        Replace the in-memory copies of the updated ones.
+        """
+        for name in names or list(self.urls):
+            _, meta = self._read(name)
+            try:
+                raw, meta = self._download(name, meta)
+                if not raw:
+                    continue  # not modified
+                schema = self._parse(name, raw, meta)
+            except SchemaStoreError as err:
+                logger.warning(err)
+            else:  # modified
+                self._write(name, raw, meta)
+                with self._lock:
+                    if self._data is not None:
+                        data = dict(self._data)
+                        data[name] = schema
+                        self._data = data  # swap
+                logger.info("Updated schema %s.", name)
+
+    # -------------
+    #   Mapping
+    # -------------
+
+    def __getitem__(self, key):
+        self.load()
+        return self._data[key]
+
+    def __iter__(self):
+        self.load()
+        return iter(self._data)
+
+    def __len__(self):
+        self.load()
+        return len(self._data)